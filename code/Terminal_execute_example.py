@@ -5,11 +5,12 @@ import time
 from collections import Counter
 from threading import Thread, Event
 from imutils.video import FPS
-import playsound
 import os
 import tkinter as tk
 from tkinter import ttk, BooleanVar, Checkbutton, Button, filedialog, messagebox, Frame, Label, scrolledtext
 from twilio.rest import Client
+from analytics import DwellAnalytics, write_heatmap_csv, write_summary
+from audio import AlarmSoundEngine, ALERT_PATH
 
 # Configuration for Twilio
 FARM_OWNER_NUMBER = "+525663724981"
@@ -20,7 +21,8 @@ TWILIO_PHONE_NUMBER = "+18582640158"
 # Paths
 PROTO_PATH = "C:/Users/Angel/Desktop/files/models/MobileNetSSD_deploy.prototxt.txt"
 MODEL_PATH = "C:/Users/Angel/Desktop/files/models/MobileNetSSD_deploy.caffemodel"
-SIREN_PATH = "siren/Siren.wav"
+# siren/Siren.wav no se incluye en el repositorio: se usa el tono de alerta incluido
+SIREN_PATH = ALERT_PATH
 
 # Classes
 CLASSES = ["background", "aeroplane", "bicycle", "bird", "boat", "bottle", "bus", "car", "cat", 
@@ -29,14 +31,14 @@ CLASSES = ["background", "aeroplane", "bicycle", "bird", "boat", "bottle", "bus"
 REQ_CLASSES = ["bird", "cat", "cow", "dog", "horse", "sheep"]
 
 # Global variables
-detection_report = []
-animal_timers = {}
+analytics = DwellAnalytics(REQ_CLASSES)
 animal_vars = {}
 stop_event = Event()
 detection_active = False
 video_capture = None
 alarm_active = False
 event_log = None
+siren_engine = None
 
 class FPSCounter:
     def __init__(self):
@@ -62,6 +64,9 @@ class FPSCounter:
     def fps(self):
         return self._current_fps
 
+    def stop(self):
+        return self
+
 def load_model(proto_path, model_path):
     if not os.path.exists(proto_path):
         raise FileNotFoundError(f"Prototxt file not found: {proto_path}")
@@ -83,14 +88,25 @@ def send_sms(phone_number, detected_time):
         print(f"[ERROR] Failed to send SMS: {e}")
         return False
 
-def play_siren(siren_path):
-    if not os.path.exists(siren_path):
-        print(f"[ERROR] Siren file not found: {siren_path}")
+def load_siren(siren_path):
+    # El sonido se decodifica una sola vez y se reproduce en un dispositivo persistente
+    global siren_engine
+    if siren_engine is None:
+        siren_engine = AlarmSoundEngine({"siren": siren_path},
+                                        on_error=lambda e: print(f"[ERROR] Failed to play siren: {e}"))
+    return siren_engine
+
+def play_siren():
+    if siren_engine is None:
+        print("[ERROR] Siren not loaded")
         return
-    try:
-        playsound.playsound(siren_path, block=False)
-    except Exception as e:
-        print(f"[ERROR] Failed to play siren: {e}")
+    siren_engine.play("siren", priority=10)
+
+def close_siren():
+    global siren_engine
+    if siren_engine is not None:
+        siren_engine.close()
+        siren_engine = None
 
 def log_event(message, level="info"):
     if event_log:
@@ -236,6 +252,10 @@ class AnimalDetectionApp:
         try:
             net = load_model(PROTO_PATH, MODEL_PATH)
             log_event("Modelo cargado correctamente")
+            try:
+                load_siren(SIREN_PATH)
+            except Exception as e:
+                log_event(f"No se pudo cargar la sirena: {str(e)}", "error")
             
             # Iniciar detección en un hilo separado
             detection_thread = Thread(target=self.run_detection, args=(net,), daemon=True)
@@ -303,7 +323,7 @@ class AnimalDetectionApp:
                     if sum(detection_history) > 15 and not alarm_active and (current_time - last_alert_time) > alert_cooldown:
                         detected_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
                         log_event(f"¡Intrusión de animal detectada a las {detected_time}!", "warning")
-                        play_siren(SIREN_PATH)
+                        play_siren()
                         send_sms(FARM_OWNER_NUMBER, detected_time)
                         alarm_active = True
                         last_alert_time = current_time
@@ -317,6 +337,7 @@ class AnimalDetectionApp:
             fps.stop()
             log_event(f"Procesamiento completado. FPS promedio: {fps.fps():.2f}")
             print(f"[INFO] FPS promedio: {fps.fps():.2f}")
+            analytics.close_all()
             cleanup_resources()
             self.root.after(0, lambda: [
                 self.start_btn.config(state='normal'),
@@ -325,6 +346,7 @@ class AnimalDetectionApp:
     
     def process_frame(self, frame, detections, h, w):
         detections_in_frame = []
+        tracked = []
         
         for i in np.arange(0, detections.shape[2]):
             confidence = detections[0, 0, i, 2]
@@ -334,6 +356,7 @@ class AnimalDetectionApp:
                 
                 if animal in REQ_CLASSES and animal_vars[animal].get():
                     detections_in_frame.append(animal)
+                    tracked.append((animal, confidence, detections[0, 0, i, 3:7]))
                     box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
                     (startX, startY, endX, endY) = box.astype("int")
                     
@@ -341,36 +364,20 @@ class AnimalDetectionApp:
                     label = f"{animal}: {confidence * 100:.1f}%"
                     cv2.putText(frame, label, (startX, startY - 15), 
                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                    
-                    if animal not in animal_timers:
-                        animal_timers[animal] = {"start": time.time(), "end": None}
-                        log_event(f"Detección de {animal} a las {time.strftime('%H:%M:%S')}")
         
-        self.update_detection_times(detections_in_frame)
+        for animal in analytics.update(tracked, time.time()):
+            log_event(f"Detección de {animal} a las {time.strftime('%H:%M:%S')}")
         return detections_in_frame
     
-    def update_detection_times(self, current_detections):
-        for animal in list(animal_timers.keys()):
-            if animal not in current_detections and animal_timers[animal]["end"] is None:
-                animal_timers[animal]["end"] = time.time()
-                detection_report.append({
-                    "animal": animal,
-                    "hora": time.strftime("%Y-%m-%d %H:%M:%S"),
-                    "duracion": animal_timers[animal]["end"] - animal_timers[animal]["start"]
-                })
-                del animal_timers[animal]
-    
     def export_report(self):
-        if not detection_report:
+        if not analytics.n_visits:
             log_event("No se detectaron animales para generar informe", "warning")
             messagebox.showwarning("Advertencia", "No hay datos para exportar.")
             return
         
         # Filtrar detecciones según los checkboxes activos
-        filtered_detections = [
-            entry for entry in detection_report
-            if animal_vars[entry["animal"]].get()
-        ]
+        selected = [a for a in REQ_CLASSES if animal_vars[a].get()]
+        filtered_detections = analytics.visits(selected)
         
         if not filtered_detections:
             log_event("No hay datos con los filtros actuales para generar informe", "warning")
@@ -387,15 +394,19 @@ class AnimalDetectionApp:
             try:
                 with open(report_path, "w", encoding="utf-8") as f:
                     f.write("=== INFORME DE DETECCIONES ===\n\n")
-                    f.write(f"Animales incluidos: {', '.join([a for a in REQ_CLASSES if animal_vars[a].get()])}\n\n")
+                    f.write(f"Animales incluidos: {', '.join(selected)}\n\n")
+                    write_summary(f, analytics, selected)
+                    f.write("\n")
                     
-                    for entry in filtered_detections:
-                        f.write(f"Animal: {entry['animal']}\n")
-                        f.write(f"Hora: {entry['hora']}\n")
-                        f.write(f"Duración: {entry['duracion']:.2f} segundos\n")
+                    for animal, start, duration in filtered_detections:
+                        f.write(f"Animal: {animal}\n")
+                        f.write(f"Hora: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start + duration))}\n")
+                        f.write(f"Duración: {duration:.2f} segundos\n")
                         f.write("-" * 40 + "\n")
+                heatmap_path = os.path.splitext(report_path)[0] + "_mapa_calor.csv"
+                write_heatmap_csv(heatmap_path, analytics, selected)
                 
-                log_event(f"Informe exportado correctamente: {report_path}")
+                log_event(f"Informe exportado correctamente: {report_path} (mapa de calor: {heatmap_path})")
                 messagebox.showinfo("Éxito", f"Informe guardado en:\n{report_path}")
                 os.startfile(report_path)
             except Exception as e:
@@ -409,6 +420,7 @@ class AnimalDetectionApp:
         if video_capture is not None and video_capture.isOpened():
             video_capture.release()
         
+        close_siren()
         cv2.destroyAllWindows()
         self.root.destroy()
 
@@ -419,6 +431,7 @@ def cleanup_resources():
     
     if video_capture is not None:
         video_capture.release()
+    close_siren()
     cv2.destroyAllWindows()
 
 if __name__ == "__main__":
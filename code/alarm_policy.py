@@ -0,0 +1,32 @@
+from collections import deque
+
+
+class AlarmPolicy:
+    """Ventana deslizante de frames con detección: la alarma se dispara cuando más de
+    ``min_hits`` de los últimos ``window`` frames tuvieron algún animal y ya pasó el
+    ``cooldown`` (en segundos) desde la alarma anterior."""
+
+    def __init__(self, window=36, min_hits=15, cooldown=5):
+        self.window = window
+        self.min_hits = min_hits
+        self.cooldown = cooldown
+        self.reset()
+
+    def reset(self):
+        self._history = deque(maxlen=self.window)
+        self._hits = 0
+        self.last_alert_time = None
+
+    def update(self, detected, now, can_alert=True):
+        if len(self._history) == self.window:
+            self._hits -= self._history[0]
+        value = 1 if detected else 0
+        self._history.append(value)
+        self._hits += value
+
+        if not can_alert or len(self._history) < self.window or self._hits <= self.min_hits:
+            return False
+        if self.last_alert_time is not None and now - self.last_alert_time <= self.cooldown:
+            return False
+        self.last_alert_time = now
+        return True
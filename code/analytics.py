@@ -0,0 +1,206 @@
+"""Analítica incremental de permanencia (dwell time) por pista y por clase.
+
+Reemplaza los temporizadores de un solo intervalo por clase: cada animal visible es
+una pista propia (dos perros a la vez son dos visitas), emparejada entre frames por
+IoU. Todo el estado vive en arreglos de tamaño fijo y los agregados (ocupación,
+visitas, histograma de permanencia, mapa de calor de centros) se actualizan en O(1)
+por detección, así que la interfaz y los informes los leen sin recorrer ningún log.
+La lista de visitas para exportar es un anillo de ``max_visits`` entradas: en una
+ejecución de semanas se conservan las más recientes, pero los agregados cuentan todas.
+"""
+import csv
+
+import numpy as np
+
+from detector import REQ_CLASSES
+
+# Límites de los intervalos del histograma de permanencia, en segundos
+DWELL_BINS = np.array([0, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, np.inf])
+DWELL_LABELS = [f"{lo:g}-{hi:g} s" if np.isfinite(hi) else f"{lo:g}+ s"
+                for lo, hi in zip(DWELL_BINS[:-1], DWELL_BINS[1:])]
+
+
+def _iou_matrix(a, b):
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+class DwellAnalytics:
+    def __init__(self, classes=REQ_CLASSES, max_tracks=64, iou_thresh=0.3, max_missed=3, heatmap_size=(32, 32),
+                 max_visits=100000):
+        self.classes = list(classes)
+        self.class_index = {c: i for i, c in enumerate(self.classes)}
+        self.max_tracks = max_tracks
+        self.iou_thresh = iou_thresh
+        self.max_missed = max_missed  # Frames sin ver la pista antes de cerrar la visita
+        self.heatmap_size = heatmap_size
+        self.max_visits = max_visits
+        self.reset()
+
+    def reset(self):
+        n = len(self.classes)
+        # Estado por pista
+        self.track_active = np.zeros(self.max_tracks, dtype=bool)
+        self.track_class = np.zeros(self.max_tracks, dtype=np.int16)
+        self.track_start = np.zeros(self.max_tracks, dtype=np.float64)
+        self.track_last = np.zeros(self.max_tracks, dtype=np.float64)
+        self.track_missed = np.zeros(self.max_tracks, dtype=np.int32)
+        self.track_box = np.zeros((self.max_tracks, 4), dtype=np.float32)
+
+        # Agregados por clase
+        self.occupancy = np.zeros(n, dtype=np.int32)
+        self.frames_seen = np.zeros(n, dtype=np.int64)
+        self.visit_count = np.zeros(n, dtype=np.int64)
+        self.dwell_total = np.zeros(n, dtype=np.float64)
+        self.dwell_max = np.zeros(n, dtype=np.float64)
+        self.dwell_hist = np.zeros((n, len(DWELL_BINS) - 1), dtype=np.int64)
+        self.heatmap = np.zeros((n,) + tuple(self.heatmap_size), dtype=np.int64)
+        self.dropped = 0  # Detecciones sin pista libre
+
+        # Últimas visitas cerradas, en un anillo de tamaño fijo (para exportar)
+        self._visit_class = np.zeros(self.max_visits, dtype=np.int16)
+        self._visit_start = np.zeros(self.max_visits, dtype=np.float64)
+        self._visit_duration = np.zeros(self.max_visits, dtype=np.float32)
+        self.n_visits = 0  # Visitas cerradas en total (también las que ya salieron del anillo)
+
+    def update(self, detections, now):
+        """Procesa las detecciones de un frame: ``[(animal, confianza, (x1, y1, x2, y2))]``
+        con coordenadas normalizadas. Devuelve las clases de las pistas nuevas."""
+        opened = []
+        matched = np.zeros(self.max_tracks, dtype=bool)
+        by_class = {}
+        for animal, _, box in detections:
+            if animal in self.class_index:
+                by_class.setdefault(self.class_index[animal], []).append(box)
+
+        gh, gw = self.heatmap_size
+        for c, boxes in by_class.items():
+            boxes = np.asarray(boxes, dtype=np.float32)
+            self.frames_seen[c] += 1
+
+            centers = np.clip(((boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2), 0, 0.999999)
+            np.add.at(self.heatmap[c], ((centers[1] * gh).astype(int), (centers[0] * gw).astype(int)), 1)
+
+            # Emparejamiento voraz por IoU con las pistas activas de la misma clase
+            tracks = np.flatnonzero(self.track_active & (self.track_class == c))
+            free_dets = np.ones(len(boxes), dtype=bool)
+            if len(tracks):
+                ious = _iou_matrix(boxes, self.track_box[tracks])
+                for flat in np.argsort(-ious, axis=None):
+                    d, t = divmod(int(flat), len(tracks))
+                    if ious[d, t] < self.iou_thresh:
+                        break
+                    track = tracks[t]
+                    if free_dets[d] and not matched[track]:
+                        free_dets[d] = False
+                        matched[track] = True
+                        self.track_box[track] = boxes[d]
+                        self.track_last[track] = now
+                        self.track_missed[track] = 0
+
+            for d in np.flatnonzero(free_dets):
+                track = self._open_track(c, boxes[d], now)
+                if track is not None:
+                    matched[track] = True
+                    opened.append(self.classes[c])
+
+        # Pistas que no aparecieron en este frame
+        unseen = self.track_active & ~matched
+        self.track_missed[unseen] += 1
+        for track in np.flatnonzero(unseen & (self.track_missed > self.max_missed)):
+            self._close_track(track)
+        return opened
+
+    def _open_track(self, c, box, now):
+        free = np.flatnonzero(~self.track_active)
+        if not len(free):
+            self.dropped += 1
+            return None
+        track = free[0]
+        self.track_active[track] = True
+        self.track_class[track] = c
+        self.track_start[track] = now
+        self.track_last[track] = now
+        self.track_missed[track] = 0
+        self.track_box[track] = box
+        self.occupancy[c] += 1
+        return track
+
+    def _close_track(self, track):
+        c = self.track_class[track]
+        duration = self.track_last[track] - self.track_start[track]
+        self.track_active[track] = False
+        self.occupancy[c] -= 1
+        self.visit_count[c] += 1
+        self.dwell_total[c] += duration
+        self.dwell_max[c] = max(self.dwell_max[c], duration)
+        self.dwell_hist[c, np.searchsorted(DWELL_BINS, duration, side="right") - 1] += 1
+
+        slot = self.n_visits % self.max_visits
+        self._visit_class[slot] = c
+        self._visit_start[slot] = self.track_start[track]
+        self._visit_duration[slot] = duration
+        self.n_visits += 1
+
+    def close_all(self):
+        for track in np.flatnonzero(self.track_active):
+            self._close_track(track)
+
+    def visits(self, classes=None):
+        # [(animal, inicio, duración)] de las últimas max_visits visitas, en orden de cierre
+        wanted = None if classes is None else {self.class_index[c] for c in classes if c in self.class_index}
+        result = []
+        for n in range(max(self.n_visits - self.max_visits, 0), self.n_visits):
+            i = n % self.max_visits
+            c = int(self._visit_class[i])
+            if wanted is None or c in wanted:
+                result.append((self.classes[c], float(self._visit_start[i]), float(self._visit_duration[i])))
+        return result
+
+    def summary(self, animal):
+        c = self.class_index[animal]
+        visits = int(self.visit_count[c])
+        return {
+            "occupancy": int(self.occupancy[c]),
+            "frames": int(self.frames_seen[c]),
+            "visits": visits,
+            "dwell_total": float(self.dwell_total[c]),
+            "dwell_mean": float(self.dwell_total[c] / visits) if visits else 0.0,
+            "dwell_max": float(self.dwell_max[c]),
+            "dwell_hist": self.dwell_hist[c].tolist(),
+        }
+
+
+def write_summary(f, analytics, classes=None):
+    """Escribe en ``f`` el resumen por clase con su histograma de permanencia."""
+    for animal in analytics.classes if classes is None else classes:
+        stats = analytics.summary(animal)
+        if not stats["visits"]:
+            continue
+        f.write(f"{animal.capitalize()}: {stats['visits']} visitas, total {stats['dwell_total']:.2f} s, "
+                f"media {stats['dwell_mean']:.2f} s, máxima {stats['dwell_max']:.2f} s\n")
+        for label, count in zip(DWELL_LABELS, stats["dwell_hist"]):
+            if count:
+                f.write(f"    {label}: {count}\n")
+
+
+def write_heatmap_csv(path, analytics, classes=None):
+    """Guarda el mapa de calor de centros: una fila por celda con detecciones.
+
+    ``x`` e ``y`` son el centro de la celda en coordenadas normalizadas del frame."""
+    gh, gw = analytics.heatmap_size
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["animal", "fila", "columna", "x", "y", "detecciones"])
+        for animal in analytics.classes if classes is None else classes:
+            grid = analytics.heatmap[analytics.class_index[animal]]
+            for row, col in zip(*np.nonzero(grid)):
+                writer.writerow([animal, row, col, f"{(col + 0.5) / gw:.4f}", f"{(row + 0.5) / gh:.4f}",
+                                 int(grid[row, col])])
@@ -0,0 +1,143 @@
+"""Motor de sonido para alarmas.
+
+Los sonidos se decodifican una sola vez al iniciar (MP3/WAV/FLAC a PCM de 16 bits)
+y se reproducen en un único dispositivo de salida que queda abierto, así que una
+alarma no lee ni decodifica nada del disco ni crea hilos nuevos. Cada reproducción
+tiene una prioridad: un sonido interrumpe al que está sonando si su prioridad es
+igual o mayor, y se descarta si es menor.
+
+Usa ``miniaudio`` si está instalado. Si no, recurre a ``playsound`` desde un único
+hilo trabajador persistente (sin decodificación previa ni interrupción).
+"""
+import os
+import queue
+import threading
+from array import array
+
+try:
+    import miniaudio
+except ImportError:
+    miniaudio = None
+    import playsound
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ALERT_PATH = os.path.join(REPO_ROOT, "alert", "ringtone.mp3")
+
+# Resultados de AlarmSoundEngine.play
+PLAYED = "reproducido"
+BLOCKED = "bloqueado"  # Está sonando algo de mayor prioridad
+BUSY = "ocupado"  # Sin miniaudio: ya hay otro sonido esperando al trabajador
+
+
+class _Playback:
+    def __init__(self, name, samples, priority):
+        self.name = name
+        self.samples = samples
+        self.priority = priority
+        self.position = 0
+
+
+class AlarmSoundEngine:
+    def __init__(self, sounds, sample_rate=44100, nchannels=2, buffer_msec=50, on_error=None):
+        for name, path in sounds.items():
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"No se encontró el sonido '{name}': {path}")
+
+        self.paths = dict(sounds)
+        self.sample_rate = sample_rate
+        self.nchannels = nchannels
+        self.on_error = on_error  # Llamado con la excepción si falla una reproducción
+        self._lock = threading.Lock()
+        self._current = None
+        self._device = None
+        self._queue = None
+
+        if miniaudio is not None:
+            self._sounds = {
+                name: miniaudio.decode_file(path, output_format=miniaudio.SampleFormat.SIGNED16,
+                                            nchannels=nchannels, sample_rate=sample_rate).samples
+                for name, path in sounds.items()
+            }
+            self._device = miniaudio.PlaybackDevice(output_format=miniaudio.SampleFormat.SIGNED16,
+                                                    nchannels=nchannels, sample_rate=sample_rate,
+                                                    buffersize_msec=buffer_msec)
+            stream = self._stream()
+            next(stream)
+            self._device.start(stream)
+        else:
+            self._sounds = {}
+            self._queue = queue.Queue(maxsize=1)
+            threading.Thread(target=self._fallback_worker, daemon=True).start()
+
+    def _stream(self):
+        # Generador que alimenta al dispositivo: mezcla el sonido actual o silencio
+        required_frames = yield array("h")
+        while True:
+            needed = required_frames * self.nchannels
+            with self._lock:
+                current = self._current
+                if current is not None:
+                    chunk = current.samples[current.position:current.position + needed]
+                    current.position += needed
+                    if current.position >= len(current.samples):
+                        self._current = None
+                else:
+                    chunk = array("h")
+            if len(chunk) < needed:
+                chunk.extend(array("h", [0]) * (needed - len(chunk)))
+            required_frames = yield chunk
+
+    def _fallback_worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            with self._lock:
+                self._current = item
+            try:
+                playsound.playsound(self.paths[item.name], block=True)
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(e)
+            finally:
+                with self._lock:
+                    if self._current is item:
+                        self._current = None
+
+    def play(self, name, priority=0):
+        """Reproduce ``name``; devuelve ``PLAYED``, ``BLOCKED`` o ``BUSY``."""
+        if name not in self.paths:
+            raise KeyError(f"Sonido desconocido: {name}")
+        with self._lock:
+            if self._current is not None and self._current.priority > priority:
+                return BLOCKED
+            playback = _Playback(name, self._sounds.get(name), priority)
+            if self._device is not None:
+                self._current = playback
+                return PLAYED
+        # Sin miniaudio: el trabajador no puede cortar un sonido en curso; si hay
+        # otro esperando, se descarta
+        try:
+            self._queue.put_nowait(playback)
+            return PLAYED
+        except queue.Full:
+            return BUSY
+
+    def stop(self):
+        with self._lock:
+            if self._device is not None:
+                self._current = None
+
+    def is_playing(self):
+        with self._lock:
+            return self._current is not None
+
+    def close(self):
+        if self._device is not None:
+            self._device.close()
+            self._device = None
+        elif self._queue is not None:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
@@ -0,0 +1,89 @@
+"""Compara la cascada contra el detector de una sola etapa sobre un video.
+
+Uso:
+    python code/benchmark_cascade.py --video "videos/animal detection.mp4"
+
+El detector de una sola etapa se toma como referencia: el recall indica qué
+fracción de sus detecciones también encuentra la cascada (misma clase, IoU >= 0.5).
+"""
+import argparse
+import os
+import time
+
+import cv2
+import imutils
+
+from detector import PROTO_PATH, MODEL_PATH, load_model, filter_detections, iou, SingleStageDetector, CascadeDetector
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_VIDEO = os.path.join(REPO_ROOT, "videos", "animal detection.mp4")
+
+
+def run_pass(video_path, detector, conf_thresh, max_frames=None):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"No se pudo abrir el archivo de video: {video_path}")
+
+    per_frame = []
+    start = time.perf_counter()
+    try:
+        while max_frames is None or len(per_frame) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame = imutils.resize(frame, width=800)
+            per_frame.append(filter_detections(detector.detect(frame), conf_thresh))
+    finally:
+        cap.release()
+    elapsed = time.perf_counter() - start
+    return per_frame, (len(per_frame) / elapsed if elapsed > 0 else 0.0)
+
+
+def recall(reference, candidate, iou_thresh=0.5):
+    matched = total = 0
+    frames_hit = frames_total = 0
+    for ref_dets, cand_dets in zip(reference, candidate):
+        if ref_dets:
+            frames_total += 1
+            frames_hit += 1 if cand_dets else 0
+        used = set()
+        for animal, _, box in ref_dets:
+            total += 1
+            for j, (cand_animal, _, cand_box) in enumerate(cand_dets):
+                if j not in used and cand_animal == animal and iou(box, cand_box) >= iou_thresh:
+                    used.add(j)
+                    matched += 1
+                    break
+    box_recall = matched / total if total else 1.0
+    frame_recall = frames_hit / frames_total if frames_total else 1.0
+    return box_recall, frame_recall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la cascada frente al detector de una etapa")
+    parser.add_argument("--video", default=DEFAULT_VIDEO)
+    parser.add_argument("--proto", default=PROTO_PATH)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--conf", type=float, default=0.2, help="Umbral de la etapa completa")
+    parser.add_argument("--gate-thresh", type=float, default=0.15, help="Umbral de la etapa rápida")
+    parser.add_argument("--gate-size", type=int, default=150, help="Resolución de entrada de la etapa rápida")
+    parser.add_argument("--max-frames", type=int, default=None)
+    args = parser.parse_args()
+
+    net = load_model(args.proto, args.model)
+
+    single, single_fps = run_pass(args.video, SingleStageDetector(net), args.conf, args.max_frames)
+    cascade_detector = CascadeDetector(net, gate_size=args.gate_size, gate_thresh=args.gate_thresh)
+    cascade, cascade_fps = run_pass(args.video, cascade_detector, args.conf, args.max_frames)
+    box_recall, frame_recall = recall(single, cascade)
+
+    print(f"[INFO] Frames procesados: {len(single)}")
+    print(f"[INFO] Una etapa: {single_fps:.2f} FPS")
+    print(f"[INFO] Cascada:   {cascade_fps:.2f} FPS "
+          f"(x{cascade_fps / single_fps if single_fps else 0:.2f}, "
+          f"detector completo en {cascade_detector.fire_rate() * 100:.1f}% de los frames)")
+    print(f"[INFO] Recall de la cascada: {box_recall * 100:.1f}% de cajas, {frame_recall * 100:.1f}% de frames con animales")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import time
+from collections import OrderedDict
+
+import cv2
+
+
+def frame_hash(frame, hash_size=8):
+    # dHash: compara píxeles vecinos de una versión reducida en escala de grises.
+    # Es barato (una reducción a 9x8) y tolera ruido de compresión y pequeños cambios de brillo.
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    diff = small[:, 1:] > small[:, :-1]
+    value = 0
+    for bit in diff.flatten():
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class DetectionCache:
+    """Caché LRU de detecciones indexada por el hash perceptual del frame.
+
+    Un acierto reutiliza la salida de ``net.forward()`` de un frame casi idéntico
+    visto hace menos de ``max_age`` segundos.
+    """
+
+    def __init__(self, max_size=32, tolerance=4, max_age=2.0):
+        self.max_size = max_size
+        self.tolerance = tolerance  # Distancia de Hamming máxima (de 64 bits)
+        self.max_age = max_age
+        self._entries = OrderedDict()  # hash -> (timestamp, detecciones)
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key, now=None):
+        now = time.time() if now is None else now
+        best_key = None
+        best_dist = self.tolerance + 1
+
+        for cached_key, (stamp, _) in list(self._entries.items()):
+            if now - stamp > self.max_age:
+                del self._entries[cached_key]
+                continue
+            dist = hamming_distance(key, cached_key)
+            if dist < best_dist:
+                best_key, best_dist = cached_key, dist
+                if dist == 0:
+                    break
+
+        if best_key is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(best_key)
+        return self._entries[best_key][1]
+
+    def store(self, key, detections, now=None):
+        now = time.time() if now is None else now
+        self._entries[key] = (now, detections)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        # Descarta las detecciones guardadas sin tocar las estadísticas
+        self._entries.clear()
+
+    def clear(self):
+        self.invalidate()
+        self.hits = 0
+        self.misses = 0
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
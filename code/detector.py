@@ -0,0 +1,98 @@
+import os
+
+import cv2
+import numpy as np
+
+CLASSES = ["background", "aeroplane", "bicycle", "bird", "boat", "bottle", "bus",
+           "car", "cat", "chair", "cow", "dining-table", "dog", "horse", "motorbike",
+           "person", "potted plant", "sheep", "sofa", "train", "monitor"]
+REQ_CLASSES = ["bird", "cat", "cow", "dog", "horse", "sheep"]
+
+PROTO_PATH = "C:/Users/Angel/Desktop/files/models/MobileNetSSD_deploy.prototxt.txt"
+MODEL_PATH = "C:/Users/Angel/Desktop/files/models/MobileNetSSD_deploy.caffemodel"
+
+# Salida vacía con la misma forma que net.forward(): (1, 1, N, 7)
+EMPTY_DETECTIONS = np.zeros((1, 1, 0, 7), dtype=np.float32)
+
+
+def load_model(proto_path=PROTO_PATH, model_path=MODEL_PATH):
+    if not os.path.exists(proto_path):
+        raise FileNotFoundError(f"No se encontró el archivo prototxt: {proto_path}")
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"No se encontró el modelo: {model_path}")
+    return cv2.dnn.readNetFromCaffe(proto_path, model_path)
+
+
+def run_ssd(net, frame, size=300):
+    blob = cv2.dnn.blobFromImage(cv2.resize(frame, (size, size)), 0.007843, (size, size), 127.5)
+    net.setInput(blob)
+    return net.forward()
+
+
+def filter_detections(detections, conf_thresh, classes=REQ_CLASSES):
+    # Devuelve [(animal, confianza, (x1, y1, x2, y2) normalizados)] de las clases pedidas
+    results = []
+    for i in range(detections.shape[2]):
+        confidence = float(detections[0, 0, i, 2])
+        if confidence > conf_thresh:
+            animal = CLASSES[int(detections[0, 0, i, 1])]
+            if animal in classes:
+                results.append((animal, confidence, tuple(float(v) for v in detections[0, 0, i, 3:7])))
+    return results
+
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class SingleStageDetector:
+    def __init__(self, net, size=300):
+        self.net = net
+        self.size = size
+
+    def detect(self, frame):
+        return run_ssd(self.net, frame, self.size)
+
+    def set_input_size(self, size):
+        self.size = size
+
+
+class CascadeDetector:
+    """Cascada de dos etapas: una pasada barata decide si hay algún animal y solo
+    entonces se ejecuta el detector completo.
+
+    La compuerta usa el mismo MobileNetSSD a menor resolución salvo que se pase
+    ``gate_net`` (por ejemplo, un clasificador más pequeño con la misma salida SSD).
+    """
+
+    def __init__(self, net, gate_net=None, gate_size=150, gate_thresh=0.15,
+                 full_size=300, classes=REQ_CLASSES):
+        self.net = net
+        self.gate_net = gate_net if gate_net is not None else net
+        self.gate_size = gate_size
+        self.gate_thresh = gate_thresh
+        self.full_size = full_size
+        self.classes = classes
+        self.gate_runs = 0
+        self.full_runs = 0
+
+    def gate(self, frame):
+        self.gate_runs += 1
+        detections = run_ssd(self.gate_net, frame, self.gate_size)
+        return len(filter_detections(detections, self.gate_thresh, self.classes)) > 0
+
+    def detect(self, frame):
+        if not self.gate(frame):
+            return EMPTY_DETECTIONS
+        self.full_runs += 1
+        return run_ssd(self.net, frame, self.full_size)
+
+    def set_input_size(self, size):
+        self.full_size = size
+
+    def fire_rate(self):
+        return self.full_runs / self.gate_runs if self.gate_runs else 0.0
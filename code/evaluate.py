@@ -0,0 +1,311 @@
+"""Evalúa precisión y velocidad del detector sobre clips etiquetados.
+
+Cada video necesita un archivo de referencia ``<video>.gt.csv`` (o ``--gt``) en uno
+de estos dos formatos:
+
+    frame,animal,x1,y1,x2,y2            # cajas por frame, coordenadas normalizadas 0-1
+    start_frame,end_frame,animal        # intervalos (inclusive) donde el animal es visible
+
+Con cajas se evalúa por caja (IoU >= 0.5); con intervalos, por presencia de clase en
+cada frame. Los frames sin filas se consideran sin animales.
+
+Uso:
+    python code/evaluate.py "videos/animal detection.mp4" --conf 0.2 --stride 2 --size 200
+"""
+import argparse
+import csv
+import json
+import os
+import time
+
+import cv2
+import imutils
+import numpy as np
+
+from alarm_policy import AlarmPolicy
+from detector import (PROTO_PATH, MODEL_PATH, REQ_CLASSES, load_model, filter_detections, iou,
+                      SingleStageDetector, CascadeDetector)
+
+# Confianza mínima que se guarda para poder calcular AP por debajo de --conf
+SCORE_FLOOR = 0.01
+
+
+def load_ground_truth(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        fields = set(reader.fieldnames or [])
+        rows = list(reader)
+
+    if {"frame", "animal", "x1", "y1", "x2", "y2"} <= fields:
+        boxes = {}
+        for row in rows:
+            box = tuple(float(row[k]) for k in ("x1", "y1", "x2", "y2"))
+            boxes.setdefault(int(row["frame"]), []).append((row["animal"], box))
+        return "boxes", boxes
+
+    if {"start_frame", "end_frame", "animal"} <= fields:
+        intervals = [(int(row["start_frame"]), int(row["end_frame"]), row["animal"]) for row in rows]
+        return "intervals", intervals
+
+    raise ValueError(f"Formato de referencia no reconocido: {path}")
+
+
+def presence_from_intervals(intervals, n_frames):
+    presence = [set() for _ in range(n_frames)]
+    for start, end, animal in intervals:
+        for i in range(max(start, 0), min(end, n_frames - 1) + 1):
+            presence[i].add(animal)
+    return presence
+
+
+def run_detector(video_path, detector, stride=1, width=800):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"No se pudo abrir el archivo de video: {video_path}")
+    video_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    per_frame = []
+    last = []
+    frame_idx = 0
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            # Con stride > 1 los frames saltados reutilizan las detecciones anteriores
+            if frame_idx % stride == 0:
+                frame = imutils.resize(frame, width=width)
+                last = filter_detections(detector.detect(frame), SCORE_FLOOR)
+            per_frame.append(last)
+            frame_idx += 1
+    finally:
+        cap.release()
+
+    timing = {
+        "frames": frame_idx,
+        "wall_time": time.perf_counter() - wall_start,
+        "cpu_time": time.process_time() - cpu_start,
+    }
+    return per_frame, video_fps, timing
+
+
+def match_frame(preds, gts, use_boxes, iou_thresh=0.5):
+    # Devuelve [(animal, confianza, es_verdadero_positivo)] emparejando por confianza descendente
+    results = []
+    used = set()
+    for animal, confidence, box in sorted(preds, key=lambda p: -p[1]):
+        best_j, best_iou = None, iou_thresh
+        for j, (gt_animal, gt_box) in enumerate(gts):
+            if j in used or gt_animal != animal:
+                continue
+            overlap = iou(box, gt_box) if use_boxes else 1.0
+            if overlap >= best_iou:
+                best_j, best_iou = j, overlap
+        if best_j is not None:
+            used.add(best_j)
+        results.append((animal, confidence, best_j is not None))
+    return results
+
+
+def average_precision(scores, is_tp, n_positives):
+    if n_positives == 0:
+        return None
+    if not scores:
+        return 0.0
+    order = np.argsort(-np.asarray(scores))
+    tp = np.asarray(is_tp, dtype=np.float64)[order]
+    tp_cum = np.cumsum(tp)
+    fp_cum = np.cumsum(1.0 - tp)
+    recall = tp_cum / n_positives
+    precision = tp_cum / np.maximum(tp_cum + fp_cum, np.finfo(np.float64).eps)
+
+    # Interpolación en todos los puntos (VOC 2010+)
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.concatenate(([0.0], precision, [0.0]))
+    for i in range(len(mpre) - 2, -1, -1):
+        mpre[i] = max(mpre[i], mpre[i + 1])
+    idx = np.where(mrec[1:] != mrec[:-1])[0]
+    return float(np.sum((mrec[idx + 1] - mrec[idx]) * mpre[idx + 1]))
+
+
+def detection_metrics(per_frame, gt_per_frame, use_boxes, conf_thresh, classes=REQ_CLASSES):
+    scores = {c: [] for c in classes}
+    flags = {c: [] for c in classes}
+    positives = {c: 0 for c in classes}
+
+    for preds, gts in zip(per_frame, gt_per_frame):
+        if not use_boxes:
+            # Por presencia: una predicción (la de mayor confianza) por clase y frame
+            best = {}
+            for animal, confidence, box in preds:
+                if confidence > best.get(animal, (None, -1.0))[1]:
+                    best[animal] = (animal, confidence, box)
+            preds = list(best.values())
+        for animal, _ in gts:
+            if animal in positives:
+                positives[animal] += 1
+        for animal, confidence, tp in match_frame(preds, gts, use_boxes):
+            if animal in scores:
+                scores[animal].append(confidence)
+                flags[animal].append(tp)
+
+    per_class = {}
+    total_tp = total_fp = total_pos = 0
+    for c in classes:
+        kept = [tp for s, tp in zip(scores[c], flags[c]) if s > conf_thresh]
+        tp = sum(kept)
+        fp = len(kept) - tp
+        total_tp += tp
+        total_fp += fp
+        total_pos += positives[c]
+        per_class[c] = {
+            "positives": positives[c],
+            "precision": tp / (tp + fp) if tp + fp else None,
+            "recall": tp / positives[c] if positives[c] else None,
+            "ap": average_precision(scores[c], flags[c], positives[c]),
+        }
+
+    aps = [m["ap"] for m in per_class.values() if m["ap"] is not None]
+    return {
+        "precision": total_tp / (total_tp + total_fp) if total_tp + total_fp else None,
+        "recall": total_tp / total_pos if total_pos else None,
+        "mAP": sum(aps) / len(aps) if aps else None,
+        "per_class": per_class,
+    }
+
+
+def ground_truth_events(gt_presence, merge_gap):
+    # Agrupa frames con animales en eventos [inicio, fin], uniendo huecos cortos
+    events = []
+    for i, present in enumerate(gt_presence):
+        if not present:
+            continue
+        if events and i - events[-1][1] <= merge_gap + 1:
+            events[-1][1] = i
+        else:
+            events.append([i, i])
+    return events
+
+
+def alarm_metrics(per_frame, gt_presence, video_fps, conf_thresh, policy, grace_seconds=2.0):
+    policy.reset()
+    alarm_frames = []
+    for i, preds in enumerate(per_frame):
+        detected = any(confidence > conf_thresh for _, confidence, _ in preds)
+        # Tiempo del video en lugar del reloj: el resultado no depende de la velocidad
+        if policy.update(detected, i / video_fps):
+            alarm_frames.append(i)
+
+    events = ground_truth_events(gt_presence, merge_gap=int(video_fps))
+    grace = int(grace_seconds * video_fps)
+    detected_events = set()
+    latencies = []
+    false_positives = 0
+    for frame in alarm_frames:
+        event = next((k for k, (start, end) in enumerate(events) if start <= frame <= end + grace), None)
+        if event is None:
+            false_positives += 1
+        elif event not in detected_events:
+            detected_events.add(event)
+            latencies.append((frame - events[event][0]) / video_fps)
+
+    return {
+        "events": len(events),
+        "alarms": len(alarm_frames),
+        "true_positives": len(detected_events),
+        "false_positives": false_positives,
+        "missed_events": len(events) - len(detected_events),
+        "mean_latency": sum(latencies) / len(latencies) if latencies else None,
+        "max_latency": max(latencies) if latencies else None,
+    }
+
+
+def evaluate_clip(video_path, gt_path, detector, args):
+    kind, gt = load_ground_truth(gt_path)
+    per_frame, video_fps, timing = run_detector(video_path, detector, args.stride, args.width)
+    n_frames = len(per_frame)
+
+    if kind == "boxes":
+        gt_per_frame = [gt.get(i, []) for i in range(n_frames)]
+        gt_presence = [{animal for animal, _ in boxes} for boxes in gt_per_frame]
+    else:
+        gt_presence = presence_from_intervals(gt, n_frames)
+        gt_per_frame = [[(animal, None) for animal in present] for present in gt_presence]
+
+    policy = AlarmPolicy(window=args.window, min_hits=args.min_hits, cooldown=args.cooldown)
+    return {
+        "video": video_path,
+        "ground_truth": kind,
+        "detection": detection_metrics(per_frame, gt_per_frame, kind == "boxes", args.conf),
+        "alarm": alarm_metrics(per_frame, gt_presence, video_fps, args.conf, policy),
+        "speed": {
+            "fps": timing["frames"] / timing["wall_time"] if timing["wall_time"] else None,
+            "cpu_time": timing["cpu_time"],
+            "cpu_ms_per_frame": 1000 * timing["cpu_time"] / n_frames if n_frames else None,
+        },
+    }
+
+
+def fmt(value, pattern="{:.3f}"):
+    return "-" if value is None else pattern.format(value)
+
+
+def print_report(result):
+    det, alarm, speed = result["detection"], result["alarm"], result["speed"]
+    print(f"=== {os.path.basename(result['video'])} ({result['ground_truth']}) ===")
+    print(f"Precisión: {fmt(det['precision'])}  Recall: {fmt(det['recall'])}  mAP: {fmt(det['mAP'])}")
+    for animal, m in det["per_class"].items():
+        if m["positives"]:
+            print(f"  {animal:<6} AP: {fmt(m['ap'])}  P: {fmt(m['precision'])}  R: {fmt(m['recall'])}  (n={m['positives']})")
+    print(f"Alarmas: {alarm['alarms']}  VP: {alarm['true_positives']}/{alarm['events']} eventos  "
+          f"FP: {alarm['false_positives']}  Latencia media: {fmt(alarm['mean_latency'], '{:.2f} s')}  "
+          f"máx: {fmt(alarm['max_latency'], '{:.2f} s')}")
+    print(f"FPS: {fmt(speed['fps'], '{:.2f}')}  Tiempo de CPU: {speed['cpu_time']:.2f} s "
+          f"({fmt(speed['cpu_ms_per_frame'], '{:.1f}')} ms/frame)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluación de precisión y velocidad sobre clips etiquetados")
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--gt", nargs="*", help="Archivos de referencia (por defecto <video>.gt.csv)")
+    parser.add_argument("--proto", default=PROTO_PATH)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--conf", type=float, default=0.2)
+    parser.add_argument("--stride", type=int, default=1, help="Ejecutar la red cada N frames")
+    parser.add_argument("--size", type=int, default=300, help="Resolución de entrada de la red")
+    parser.add_argument("--width", type=int, default=800, help="Ancho al que se redimensiona el frame")
+    parser.add_argument("--cascade", action="store_true")
+    parser.add_argument("--gate-size", type=int, default=150)
+    parser.add_argument("--gate-thresh", type=float, default=0.15)
+    parser.add_argument("--window", type=int, default=36)
+    parser.add_argument("--min-hits", type=int, default=15)
+    parser.add_argument("--cooldown", type=float, default=5)
+    parser.add_argument("--json", help="Guardar los resultados en este archivo")
+    args = parser.parse_args()
+
+    gt_paths = args.gt or [f"{video}.gt.csv" for video in args.videos]
+    if len(gt_paths) != len(args.videos):
+        parser.error("Se necesita un archivo de referencia por video")
+
+    net = load_model(args.proto, args.model)
+    results = []
+    for video_path, gt_path in zip(args.videos, gt_paths):
+        if args.cascade:
+            detector = CascadeDetector(net, gate_size=args.gate_size, gate_thresh=args.gate_thresh,
+                                       full_size=args.size)
+        else:
+            detector = SingleStageDetector(net, size=args.size)
+        result = evaluate_clip(video_path, gt_path, detector, args)
+        print_report(result)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2, ensure_ascii=False)
+        print(f"[INFO] Resultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
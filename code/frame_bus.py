@@ -0,0 +1,223 @@
+"""Anillo de frames en memoria compartida para varios consumidores locales.
+
+El proceso de captura/inferencia escribe cada frame anotado una sola vez con
+``FrameBusWriter``; otros procesos (grabador, vista web, analítica) lo leen sin
+copiarlo con ``FrameBusReader``. Cada escritura recibe un número de secuencia: un
+lector lento que se queda atrás más de ``n_slots`` frames salta al más reciente en
+lugar de frenar al productor, que nunca espera a nadie.
+
+Ejemplo de lector:
+
+    reader = FrameBusReader("balamia_frames")
+    seq = 0
+    while True:
+        item = reader.read_next(seq)
+        if item is None:
+            time.sleep(0.005)
+            continue
+        seq = item.seq
+        procesar(item.frame, item.detections)
+        if not item.is_valid():
+            continue  # El productor sobrescribió el slot mientras se leía
+"""
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+MAGIC = 0x42414C414D  # "BALAM"
+HEADER_FIELDS = 8  # magic, n_slots, alto, ancho, canales, max_dets, última secuencia, pid del productor
+SLOT_FIELDS = 4  # secuencia, alto, ancho, número de detecciones
+DET_FIELDS = 6  # clase, confianza, x1, y1, x2, y2 (normalizados)
+
+
+def _layout(n_slots, height, width, channels, max_dets):
+    # Devuelve (desplazamiento, forma, dtype) de cada arreglo dentro del bloque compartido
+    parts = [
+        ("header", (HEADER_FIELDS,), np.int64),
+        ("slots", (n_slots, SLOT_FIELDS), np.int64),
+        ("stamps", (n_slots,), np.float64),
+        ("detections", (n_slots, max_dets, DET_FIELDS), np.float32),
+        ("frames", (n_slots, height, width, channels), np.uint8),
+    ]
+    layout = {}
+    offset = 0
+    for name, shape, dtype in parts:
+        layout[name] = (offset, shape, dtype)
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+        offset = (offset + 63) & ~63  # Alinear a 64 bytes
+    return layout, offset
+
+
+def _pid_alive(pid):
+    if pid <= 0:
+        return False
+    if os.name == "nt":
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        kernel32.CloseHandle(handle)
+        return code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _untrack(shm):
+    try:
+        # En Python < 3.13 el resource_tracker borraría al salir un segmento que solo abrimos
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+def _remove_stale(name):
+    # Borra el segmento solo si es un bus de frames cuyo productor ya no existe
+    stale = shared_memory.SharedMemory(name=name)
+    try:
+        error = None
+        if stale.size < HEADER_FIELDS * 8:
+            error = f"El segmento {name} ya existe y no es un bus de frames"
+        else:
+            header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=stale.buf)
+            magic, pid = int(header[0]), int(header[7])
+            del header
+            if magic != MAGIC:
+                error = f"El segmento {name} ya existe y no es un bus de frames"
+            elif _pid_alive(pid):
+                error = f"El bus de frames {name} ya está en uso por el proceso {pid}"
+        if error is not None:
+            _untrack(stale)
+            raise FileExistsError(error)
+        stale.unlink()
+    finally:
+        stale.close()
+
+
+def _map_arrays(buf, layout):
+    return {name: np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+            for name, (offset, shape, dtype) in layout.items()}
+
+
+class BusFrame:
+    def __init__(self, bus, slot, seq, skipped=0):
+        self._bus = bus
+        self._slot = slot
+        self.seq = seq
+        self.skipped = skipped  # Frames perdidos desde la lectura anterior
+        h, w = bus._slots[slot, 1], bus._slots[slot, 2]
+        self.frame = bus._frames[slot, :h, :w]  # Vista sin copia sobre la memoria compartida
+        self.detections = bus._detections[slot, :bus._slots[slot, 3]].copy()
+        self.timestamp = float(bus._stamps[slot])
+
+    def is_valid(self):
+        return self._bus._slots[self._slot, 0] == self.seq
+
+
+class FrameBusWriter:
+    def __init__(self, name, frame_shape, n_slots=8, max_dets=32):
+        height, width = frame_shape[:2]
+        channels = frame_shape[2] if len(frame_shape) > 2 else 1
+        layout, size = _layout(n_slots, height, width, channels, max_dets)
+
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Puede ser un segmento huérfano de una ejecución anterior que terminó mal
+            _remove_stale(name)
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        self.name = name
+        self.n_slots = n_slots
+        self.max_dets = max_dets
+        arrays = _map_arrays(self._shm.buf, layout)
+        self._header = arrays["header"]
+        self._slots = arrays["slots"]
+        self._stamps = arrays["stamps"]
+        self._detections = arrays["detections"]
+        self._frames = arrays["frames"]
+
+        self._slots[:] = 0
+        self._header[:] = (MAGIC, n_slots, height, width, channels, max_dets, 0, os.getpid())
+        self._seq = 0
+
+    def write(self, frame, detections=(), timestamp=None):
+        self._seq += 1
+        seq = self._seq
+        slot = seq % self.n_slots
+        h = min(frame.shape[0], self._frames.shape[1])
+        w = min(frame.shape[1], self._frames.shape[2])
+
+        # Secuencia negativa mientras se escribe: los lectores descartan el slot
+        self._slots[slot, 0] = -seq
+        self._frames[slot, :h, :w] = frame.reshape(frame.shape[0], frame.shape[1], -1)[:h, :w]
+        n = min(len(detections), self.max_dets)
+        if n:
+            self._detections[slot, :n] = np.asarray(detections, dtype=np.float32)[:n]
+        self._stamps[slot] = time.time() if timestamp is None else timestamp
+        self._slots[slot, 1:] = (h, w, n)
+        self._slots[slot, 0] = seq
+        self._header[6] = seq
+        return seq
+
+    def close(self):
+        self._header = self._slots = self._stamps = self._detections = self._frames = None
+        self._shm.close()
+        self._shm.unlink()
+
+
+class FrameBusReader:
+    def __init__(self, name):
+        self._shm = shared_memory.SharedMemory(name=name)
+        _untrack(self._shm)
+
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=self._shm.buf)
+        if header[0] != MAGIC:
+            self._shm.close()
+            raise ValueError(f"El segmento {name} no es un bus de frames")
+        n_slots, height, width, channels, max_dets = (int(v) for v in header[1:6])
+        layout, _ = _layout(n_slots, height, width, channels, max_dets)
+        arrays = _map_arrays(self._shm.buf, layout)
+        self._header = arrays["header"]
+        self._slots = arrays["slots"]
+        self._stamps = arrays["stamps"]
+        self._detections = arrays["detections"]
+        self._frames = arrays["frames"]
+        self.n_slots = n_slots
+
+    def latest_seq(self):
+        return int(self._header[6])
+
+    def _read(self, seq, skipped=0):
+        slot = seq % self.n_slots
+        if self._slots[slot, 0] != seq:
+            return None
+        item = BusFrame(self, slot, seq, skipped)
+        return item if item.is_valid() else None
+
+    def read_latest(self):
+        seq = self.latest_seq()
+        return self._read(seq) if seq > 0 else None
+
+    def read_next(self, last_seq):
+        latest = self.latest_seq()
+        if latest <= last_seq:
+            return None
+        # Si el lector se quedó atrás más de lo que guarda el anillo, salta al más reciente
+        if latest - last_seq >= self.n_slots:
+            return self._read(latest, skipped=latest - last_seq - 1)
+        return self._read(last_seq + 1)
+
+    def close(self):
+        self._header = self._slots = self._stamps = self._detections = self._frames = None
+        self._shm.close()
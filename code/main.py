@@ -3,12 +3,42 @@ from tkinter import ttk, filedialog, messagebox, scrolledtext
 from PIL import Image, ImageTk
 import cv2
 import numpy as np
-import imutils
 import time
 from collections import Counter
-import playsound
 import threading
 import os
+from detection_cache import DetectionCache
+from alarm_policy import AlarmPolicy
+from analytics import DwellAnalytics, write_heatmap_csv, write_summary
+from audio import AlarmSoundEngine, ALERT_PATH, BLOCKED, BUSY
+from detector import CLASSES, REQ_CLASSES, PROTO_PATH, MODEL_PATH, load_model, SingleStageDetector, CascadeDetector
+from frame_bus import FrameBusWriter
+from mjpeg_server import MJPEGServer
+from pipeline import FramePipeline
+from profiles import ProfileScheduler
+from sidecar import DetectionRecorder, next_sidecar_path
+
+# Nombre del bus de memoria compartida para otros procesos (None lo desactiva)
+FRAME_BUS_NAME = "balamia_frames"
+
+# Vista previa MJPEG para navegadores (puerto None la desactiva). No tiene
+# autenticación: solo escucha en esta máquina salvo que se cambie el host a "0.0.0.0"
+PREVIEW_SERVER_HOST = "127.0.0.1"
+PREVIEW_SERVER_PORT = 8080
+PREVIEW_MAX_WIDTH = 640
+PREVIEW_JPEG_QUALITY = 70
+
+# Perfiles de sensibilidad por horario y zona (ver profiles.example.json)
+PROFILES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles.json")
+
+# Líneas que conserva el registro de eventos (las más antiguas se descartan)
+MAX_LOG_LINES = 1000
+
+# Guardar las detecciones de cada video en <video>.dets para repetirlas con replay.py
+RECORD_DETECTIONS = True
+
+# Prioridad del sonido de intrusión (un sonido de mayor prioridad no se interrumpe)
+ALARM_PRIORITY = 10
 
 class FPSCounter:
     def __init__(self):
@@ -34,16 +64,20 @@ class FPSCounter:
     def fps(self):
         return self._current_fps
 
+    def stop(self):
+        return self
+
 class AnimalDetectionApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Sistema de Detección de Animales")
-        self.root.state('zoomed')
+        try:
+            self.root.state('zoomed')
+        except tk.TclError:
+            self.root.attributes('-zoomed', True)  # Linux no tiene el estado 'zoomed'
         
-        self.CLASSES = ["background", "aeroplane", "bicycle", "bird", "boat", "bottle", "bus", 
-                    "car", "cat", "chair", "cow", "dining-table", "dog", "horse", "motorbike", 
-                    "person", "potted plant", "sheep", "sofa", "train", "monitor"]
-        self.REQ_CLASSES = ["bird", "cat", "cow", "dog", "horse", "sheep"]
+        self.CLASSES = CLASSES
+        self.REQ_CLASSES = REQ_CLASSES
         self.COLORS = np.random.uniform(0, 255, size=(len(self.CLASSES), 3))
         
         # Variables de control
@@ -51,16 +85,33 @@ class AnimalDetectionApp:
         self.video_path = ""
         self.cap = None
         self.net = None
+        self.detector = None
+        self.pipeline = None
+        self.frame_bus = None
+        self.frame_bus_failed = False
+        self.recorder = None
+        self.gate_thresh = 0.15  # Umbral de la etapa rápida de la cascada
+        self.gate_size = 150  # Resolución de entrada de la etapa rápida
         self.fps = None
         self.conf_thresh = 0.2
-        self.alarm_active = False
+        self.audio = None
+        self.alarm_policy = AlarmPolicy(window=36, min_hits=15, cooldown=5)
+        self.profiles = ProfileScheduler(PROFILES_PATH)
+        
+        # Permanencia por animal (pistas, visitas, histogramas) para la interfaz y el informe
+        self.analytics = DwellAnalytics(REQ_CLASSES)
         
-        # Nuevas variables para el informe
-        self.detection_log = []
-        self.current_detections = {}  # Rastrea animales en tiempo real
+        # Caché de detecciones para frames repetidos (videos de archivo casi estáticos).
+        # Es opcional: reutiliza detecciones de hasta max_age segundos, lo que en una
+        # cámara en vivo puede retrasar la detección de un animal que acaba de entrar.
+        self.detection_cache = DetectionCache(max_size=32, tolerance=4, max_age=2.0)
+        
+        self.preview_server = None
         
         self.setup_ui()
         self.load_model()
+        self.load_sounds()
+        self.start_preview_server()
 
     def setup_ui(self):
         self.main_frame = ttk.Frame(self.root)
@@ -74,6 +125,7 @@ class AnimalDetectionApp:
         self.video_panel = ttk.LabelFrame(self.main_frame, text="Vista previa", padding=(10, 5))
         self.video_panel.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         self.video_label = ttk.Label(self.video_panel)
+        self.video_image = None  # PhotoImage reutilizado entre frames del mismo tamaño
         self.video_label.pack(fill=tk.BOTH, expand=True)
         
         # Panel derecho (registro y estado)
@@ -98,6 +150,17 @@ class AnimalDetectionApp:
         self.browse_btn = ttk.Button(self.control_panel, text="Examinar...", command=self.browse_file, state='disabled')
         self.browse_btn.grid(row=4, column=0, sticky=tk.EW, pady=(0, 20))
         
+        options_frame = ttk.Frame(self.control_panel)
+        options_frame.grid(row=5, column=0, sticky=tk.W, pady=(0, 10))
+        
+        self.cascade_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Modo cascada (más rápido)", variable=self.cascade_var,
+                        onvalue=True, offvalue=False).pack(anchor=tk.W)
+        
+        self.use_cache_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Reutilizar frames repetidos (archivo)", variable=self.use_cache_var,
+                        onvalue=True, offvalue=False).pack(anchor=tk.W)
+        
         ttk.Label(self.control_panel, text="Umbral de confianza:").grid(row=6, column=0, sticky=tk.W)
         self.threshold_slider = ttk.Scale(self.control_panel, from_=0.1, to=0.9, value=0.2, 
                                          command=lambda v: self.threshold_var.set(f"{float(v):.2f}"))
@@ -165,11 +228,12 @@ class AnimalDetectionApp:
         ttk.Label(self.status_bar, textvariable=self.status_var).pack(side=tk.LEFT)
         self.fps_var = tk.StringVar(value="FPS: 0.00")
         ttk.Label(self.status_bar, textvariable=self.fps_var).pack(side=tk.RIGHT)
+        self.cache_var = tk.StringVar(value="Caché: desactivada")
+        ttk.Label(self.status_bar, textvariable=self.cache_var).pack(side=tk.RIGHT, padx=(0, 15))
 
     def handle_source_change(self, *args):
 
-        self.detection_log = []
-        self.current_detections = {}
+        self.analytics.reset()
 
         if self.source_var.get() == "Archivo":
             self.file_entry.config(state='normal')
@@ -187,25 +251,40 @@ class AnimalDetectionApp:
 
     def load_model(self):
         try:
-            proto = "C:/Users/Angel/Desktop/files/models/MobileNetSSD_deploy.prototxt.txt"
-            model = "C:/Users/Angel/Desktop/files/models/MobileNetSSD_deploy.caffemodel"
-            
-            if not os.path.exists(proto):
-                raise FileNotFoundError(f"No se encontró el archivo prototxt: {proto}")
-            if not os.path.exists(model):
-                raise FileNotFoundError(f"No se encontró el modelo: {model}")
-            
-            self.net = cv2.dnn.readNetFromCaffe(proto, model)
+            self.net = load_model(PROTO_PATH, MODEL_PATH)
             self.log_event("Modelo cargado correctamente")
         except Exception as e:
             self.log_event(f"Error al cargar el modelo: {str(e)}", "error")
             messagebox.showerror("Error", f"No se pudo cargar el modelo:\n{str(e)}")
 
+    def load_sounds(self):
+        try:
+            self.audio = AlarmSoundEngine(
+                {"alarma": ALERT_PATH},
+                on_error=lambda e: self.log_event(f"No se pudo reproducir la alarma: {str(e)}", "error"))
+        except Exception as e:
+            self.log_event(f"No se pudo cargar el sonido de alarma: {str(e)}", "error")
+
+    def start_preview_server(self):
+        if PREVIEW_SERVER_PORT is None:
+            return
+        try:
+            self.preview_server = MJPEGServer(host=PREVIEW_SERVER_HOST, port=PREVIEW_SERVER_PORT,
+                                              max_width=PREVIEW_MAX_WIDTH, quality=PREVIEW_JPEG_QUALITY).start()
+            self.log_event(f"Vista previa web en http://{PREVIEW_SERVER_HOST}:{self.preview_server.port}/")
+        except OSError as e:
+            self.preview_server = None
+            self.log_event(f"No se pudo iniciar la vista previa web: {str(e)}", "warning")
+
     def log_event(self, message, level="info"):
         self.event_log.config(state='normal')
         timestamp = time.strftime("%H:%M:%S", time.localtime())
         self.event_log.insert(tk.END, f"[{timestamp}] {message}\n")
         
+        lines = int(self.event_log.index("end-1c").split(".")[0])
+        if lines > MAX_LOG_LINES:
+            self.event_log.delete("1.0", f"{lines - MAX_LOG_LINES}.0")
+        
         if level == "error":
             self.event_log.tag_add("error", "end-1c linestart", "end-1c lineend")
             self.event_log.tag_config("error", foreground="red")
@@ -220,8 +299,8 @@ class AnimalDetectionApp:
         if self.detecting:
             return
             
-        self.detection_log = []  # <-- Vacía la lista al iniciar
-        self.current_detections = {}  # <-- También resetea los temporizadores
+        self.analytics.reset()  # <-- Vacía las visitas y pistas al iniciar
+        self.detection_cache.clear()
 
         if self.source_var.get() == "Cámara":
             self.cap = cv2.VideoCapture(0)
@@ -242,15 +321,30 @@ class AnimalDetectionApp:
                 messagebox.showerror("Error", f"No se pudo abrir el archivo de video:\n{video_path}")
                 return
             self.log_event(f"Reproduciendo video: {os.path.basename(video_path)}")
+            
+            if RECORD_DETECTIONS:
+                try:
+                    self.recorder = DetectionRecorder(next_sidecar_path(video_path), self.cap.get(cv2.CAP_PROP_FPS))
+                except OSError as e:
+                    self.log_event(f"No se pudieron guardar las detecciones: {str(e)}", "warning")
 
-        for animal in self.REQ_CLASSES:
-            self.detection_counters[animal].set("0")
+        self.update_counters()
         
         self.detecting = True
         self.start_btn.config(state='disabled')
         self.stop_btn.config(state='normal')
         self.status_var.set("Detectando animales...")
         
+        if self.cascade_var.get():
+            self.detector = CascadeDetector(self.net, gate_size=self.gate_size, gate_thresh=self.gate_thresh)
+            self.log_event("Modo cascada activado")
+        else:
+            self.detector = SingleStageDetector(self.net)
+        cache = self.detection_cache if self.use_cache_var.get() else None
+        self.cache_var.set("Caché: 0%" if cache is not None else "Caché: desactivada")
+        self.pipeline = FramePipeline(self.detector, self.profiles, self.analytics, self.alarm_policy,
+                                      cache=cache, gate_thresh=self.gate_thresh, recorder=self.recorder)
+        
         self.fps = FPSCounter().start()
         self.detection_thread = threading.Thread(target=self.detect_animals, daemon=True)
         self.detection_thread.start()
@@ -266,10 +360,7 @@ class AnimalDetectionApp:
         self.log_event("Detección detenida por el usuario")
 
     def detect_animals(self):
-        detection_history = []
         frame_count = 0
-        last_alert_time = 0
-        alert_cooldown = 5
         
         try:
             while self.detecting and self.cap.isOpened():
@@ -278,67 +369,25 @@ class AnimalDetectionApp:
                     self.log_event("Fin del video alcanzado", "warning")
                     break
                 
-                frame = imutils.resize(frame, width=800)
-                (h, w) = frame.shape[:2]
-                blob = cv2.dnn.blobFromImage(cv2.resize(frame, (300, 300)), 0.007843, (300, 300), 127.5)
-                
-                self.net.setInput(blob)
-                detections = self.net.forward()
-                
-                detections_in_frame = []
-                for i in np.arange(0, detections.shape[2]):
-                    confidence = detections[0, 0, i, 2]
-                    if confidence > float(self.threshold_var.get()):
-                        idx = int(detections[0, 0, i, 1])
-                        if self.CLASSES[idx] in self.REQ_CLASSES:
-                            box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-                            (startX, startY, endX, endY) = box.astype("int")
-                            
-                            cv2.rectangle(frame, (startX, startY), (endX, endY), (36, 255, 12), 2)
-                            label = f"{self.CLASSES[idx]}: {confidence * 100:.1f}%"
-                            y = startY - 15 if startY - 15 > 15 else startY + 15
-                            cv2.putText(frame, label, (startX, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (36, 255, 12), 2)
-                            
-                            animal = self.CLASSES[idx]
-                            detections_in_frame.append(animal)
-                            
-                            # Registro de tiempos
-                            if animal not in self.current_detections:
-                                self.current_detections[animal] = {
-                                    "start_time": time.time(),
-                                    "end_time": None
-                                }
-                
-                # Actualizar contadores y detecciones que terminaron
-                for animal in set(detections_in_frame):
-                    current = int(self.detection_counters[animal].get())
-                    self.detection_counters[animal].set(str(current + 1))
-                
-                for animal in list(self.current_detections.keys()):
-                    if animal not in detections_in_frame:
-                        self.current_detections[animal]["end_time"] = time.time()
-                        duration = self.current_detections[animal]["end_time"] - self.current_detections[animal]["start_time"]
-                        self.detection_log.append({
-                            "animal": animal,
-                            "hora": time.strftime("%Y-%m-%d %H:%M:%S"),
-                            "duracion": f"{duration:.2f} segundos"
-                        })
-                        del self.current_detections[animal]
-                
-                detection_history.append(1 if detections_in_frame else 0)
-                if len(detection_history) > 36:
-                    detection_history.pop(0)
-                    
-                    current_time = time.time()
-                    if sum(detection_history) > 15 and not self.alarm_active and (current_time - last_alert_time) > alert_cooldown:
-                        self.trigger_alarm()
-                        last_alert_time = current_time
+                result = self.pipeline.process(frame, float(self.threshold_var.get()),
+                                               reloaded=self.reload_profiles(), can_alert=not self.alarm_playing())
+                if result.profile is not None:
+                    self.log_event(f"Perfil activo: {result.profile}")
+                if result.alarm:
+                    self.trigger_alarm()
                 
+                frame = result.frame
+                self.publish_frame(frame, result.frame_dets)
+                if self.preview_server is not None:
+                    self.preview_server.publish(frame)
                 self.update_video_display(frame)
                 self.fps.update()
                 frame_count += 1
                 if frame_count % 5 == 0:
                     self.fps_var.set(f"FPS: {self.fps.fps():.2f}")
+                    if self.pipeline.cache is not None:
+                        self.cache_var.set(f"Caché: {self.detection_cache.hit_rate() * 100:.0f}%")
+                    self.update_counters()
                 
                 time.sleep(0.01)
             
@@ -353,48 +402,88 @@ class AnimalDetectionApp:
             if hasattr(self, 'cap') and self.cap.isOpened():
                 self.cap.release()
             
+            if self.frame_bus is not None:
+                self.frame_bus.close()
+                self.frame_bus = None
+            
+            if self.recorder is not None:
+                self.log_event(f"Detecciones guardadas en {os.path.basename(self.recorder.path)}")
+                self.recorder.close()
+                self.recorder = None
+            
+            # Las visitas abiertas al detener también van al informe
+            self.analytics.close_all()
+            
             cv2.destroyAllWindows()
             self.detecting = False
-            self.alarm_active = False
             self.root.after(0, self.update_ui_after_stop)
 
+    def update_counters(self):
+        for animal in self.REQ_CLASSES:
+            stats = self.analytics.summary(animal)
+            self.detection_counters[animal].set(f"{stats['visits']} visitas, {stats['occupancy']} ahora")
+
     def update_ui_after_stop(self):
+        self.update_counters()
         self.stop_btn.config(state='disabled')
         self.start_btn.config(state='normal')
         self.status_var.set("Listo")
         self.log_event(f"Procesamiento completado. FPS promedio: {self.fps.fps():.2f}")
+        if self.pipeline is not None and self.pipeline.cache is not None:
+            self.log_event(f"Aciertos de caché: {self.detection_cache.hits} "
+                           f"({self.detection_cache.hit_rate() * 100:.1f}%)")
+        if isinstance(self.detector, CascadeDetector):
+            self.log_event(f"Cascada: detector completo en {self.detector.fire_rate() * 100:.1f}% de los frames")
+
+    def reload_profiles(self):
+        try:
+            return self.profiles.reload_if_changed()
+        except Exception as e:
+            self.log_event(f"No se pudieron recargar los perfiles: {str(e)}", "error")
+            return False
+
+    def publish_frame(self, frame, frame_dets):
+        if FRAME_BUS_NAME is None or self.frame_bus_failed:
+            return
+        if self.frame_bus is None:
+            try:
+                self.frame_bus = FrameBusWriter(FRAME_BUS_NAME, frame.shape)
+            except Exception as e:
+                self.log_event(f"No se pudo crear el bus de frames: {str(e)}", "warning")
+                self.frame_bus_failed = True
+                return
+        self.frame_bus.write(frame, frame_dets)
 
     def update_video_display(self, frame):
         frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         img = Image.fromarray(frame)
-        imgtk = ImageTk.PhotoImage(image=img)
-        self.video_label.imgtk = imgtk
-        self.video_label.configure(image=imgtk)
+        if self.video_image is not None and (self.video_image.width(), self.video_image.height()) == img.size:
+            self.video_image.paste(img)
+            return
+        self.video_image = ImageTk.PhotoImage(image=img)
+        self.video_label.configure(image=self.video_image)
+
+    def alarm_playing(self):
+        return self.audio is not None and self.audio.is_playing()
 
     def trigger_alarm(self):
-        self.alarm_active = True
         self.log_event("¡Intrusión de animal detectada!", "warning")
-        
-        def play_alarm():
-            try:
-                playsound.playsound("alert/ringtone.mp3", block=False)
-            except Exception as e:
-                self.log_event(f"No se pudo reproducir la alarma: {str(e)}", "error")
-            finally:
-                self.alarm_active = False
-        
-        threading.Thread(target=play_alarm, daemon=True).start()
+        if self.audio is None:
+            return
+        result = self.audio.play("alarma", priority=ALARM_PRIORITY)
+        if result == BLOCKED:
+            self.log_event("Alarma omitida: hay un sonido de mayor prioridad en curso", "warning")
+        elif result == BUSY:
+            self.log_event("Alarma omitida: ya hay un sonido en espera", "warning")
 
     def export_report(self):
-        if not self.detection_log:
+        if not self.analytics.n_visits:
             messagebox.showwarning("Advertencia", "No hay datos para exportar.")
             return
 
-                # Filtrar detecciones según los checkboxes activos
-        filtered_detections = [
-            entry for entry in self.detection_log
-            if self.animal_vars[entry["animal"]].get()  # Solo animales seleccionados
-        ]
+        # Filtrar detecciones según los checkboxes activos
+        selected = [a for a in self.REQ_CLASSES if self.animal_vars[a].get()]
+        filtered_detections = self.analytics.visits(selected)
         
         if not filtered_detections:
             messagebox.showwarning("Advertencia", "No hay datos con los filtros actuales.")
@@ -411,15 +500,15 @@ class AnimalDetectionApp:
             try:
                 with open(report_path, "w", encoding="utf-8") as f:
                     f.write("=== INFORME FILTRADO ===\n")
-                    f.write(f"Animales incluidos: {', '.join([a for a in self.REQ_CLASSES if self.animal_vars[a].get()])}\n\n")
+                    f.write(f"Animales incluidos: {', '.join(selected)}\n\n")
                     
-                    for entry in filtered_detections:
-                        f.write(f"Animal: {entry['animal']}\n")
-                        f.write(f"Hora: {entry['hora']}\n")
-                        f.write(f"Duración: {entry['duracion']}\n")
-                        f.write("-" * 30 + "\n")
+                    write_summary(f, self.analytics, selected)
+                    f.write("\n")
+                    
+                    self.write_visits(f, filtered_detections)
+                heatmap_path = self.write_heatmap(report_path, selected)
                 
-                self.log_event(f"Informe filtrado exportado: {report_path}")
+                self.log_event(f"Informe filtrado exportado: {report_path} (mapa de calor: {heatmap_path})")
                 messagebox.showinfo("Éxito", f"Informe guardado en:\n{report_path}")
             except Exception as e:
                 self.log_event(f"Error al exportar: {str(e)}", "error")
@@ -435,18 +524,30 @@ class AnimalDetectionApp:
             try:
                 with open(report_path, "w", encoding="utf-8") as f:
                     f.write("=== INFORME DE DETECCIONES DE ANIMALES ===\n\n")
-                    for entry in self.detection_log:
-                        f.write(f"Animal: {entry['animal']}\n")
-                        f.write(f"Hora: {entry['hora']}\n")
-                        f.write(f"Duración: {entry['duracion']}\n")
-                        f.write("-" * 30 + "\n")
+                    write_summary(f, self.analytics)
+                    f.write("\n")
+                    self.write_visits(f, self.analytics.visits())
+                heatmap_path = self.write_heatmap(report_path)
                 
-                self.log_event(f"Informe exportado: {report_path}")
+                self.log_event(f"Informe exportado: {report_path} (mapa de calor: {heatmap_path})")
                 messagebox.showinfo("Éxito", f"Informe guardado en:\n{report_path}")
             except Exception as e:
                 self.log_event(f"Error al exportar: {str(e)}", "error")
                 messagebox.showerror("Error", f"No se pudo guardar el informe:\n{str(e)}")
 
+    def write_heatmap(self, report_path, classes=None):
+        # El mapa de calor va en un CSV junto al informe
+        heatmap_path = os.path.splitext(report_path)[0] + "_mapa_calor.csv"
+        write_heatmap_csv(heatmap_path, self.analytics, classes)
+        return heatmap_path
+
+    def write_visits(self, f, visits):
+        for animal, start, duration in visits:
+            f.write(f"Animal: {animal}\n")
+            f.write(f"Hora: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start + duration))}\n")
+            f.write(f"Duración: {duration:.2f} segundos\n")
+            f.write("-" * 30 + "\n")
+
     def on_closing(self):
         if self.detecting:
             self.stop_detection()
@@ -455,6 +556,12 @@ class AnimalDetectionApp:
         if self.cap and self.cap.isOpened():
             self.cap.release()
         
+        if self.preview_server is not None:
+            self.preview_server.stop()
+        
+        if self.audio is not None:
+            self.audio.close()
+        
         self.root.destroy()
 
 if __name__ == "__main__":
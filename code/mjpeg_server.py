@@ -0,0 +1,166 @@
+"""Servidor HTTP que transmite los frames anotados como MJPEG a navegadores.
+
+``publish()`` solo guarda una referencia al frame, así que el hilo de detección no se
+frena aunque haya muchos espectadores. La codificación JPEG la hace el primer hilo
+de espectador que necesita el frame y el resultado se comparte con los demás; si
+nadie está mirando no se codifica nada.
+
+Rutas: ``/`` (página con la vista previa), ``/stream`` (MJPEG) y ``/snapshot.jpg``.
+
+No hay autenticación: por defecto solo escucha en ``127.0.0.1``. Para verlo desde
+otra máquina hay que pasar ``host="0.0.0.0"`` a propósito (idealmente detrás de un
+proxy con contraseña o de una VPN).
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+BOUNDARY = "balamiaframe"
+
+INDEX_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>BalamIA - Vista previa</title></head>
+<body style="margin:0;background:#111;display:flex;justify-content:center;align-items:center;height:100vh">
+<img src="/stream" style="max-width:100%;max-height:100%">
+</body></html>
+"""
+
+
+class PreviewRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        preview = self.server.preview
+        if self.path == "/":
+            body = INDEX_HTML.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/snapshot.jpg":
+            seq, jpeg = preview.next_jpeg(0, timeout=5)
+            if jpeg is None:
+                self.send_error(503, "Sin frames disponibles")
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(jpeg)))
+            self.end_headers()
+            self.wfile.write(jpeg)
+        elif self.path == "/stream":
+            self.stream(preview)
+        else:
+            self.send_error(404)
+
+    def stream(self, preview):
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        preview.add_viewer()
+        try:
+            seq = 0
+            last_jpeg = None
+            while preview.running:
+                new_seq, jpeg = preview.next_jpeg(seq, timeout=1)
+                if jpeg is None:
+                    # Sin frames nuevos: escribir algo igual para detectar si el cliente
+                    # cerró la conexión (y liberar su hilo) aunque la detección esté parada
+                    if last_jpeg is None:
+                        self.wfile.write(b"\r\n")
+                        self.wfile.flush()
+                        continue
+                    jpeg = last_jpeg
+                seq = new_seq
+                last_jpeg = jpeg
+                self.wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                 f"Content-Length: {len(jpeg)}\r\n\r\n".encode("ascii"))
+                self.wfile.write(jpeg)
+                self.wfile.write(b"\r\n")
+                self.wfile.flush()
+        except OSError:
+            # BrokenPipeError, ConnectionResetError, ConnectionAbortedError...
+            pass
+        finally:
+            preview.remove_viewer()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MJPEGServer:
+    def __init__(self, host="127.0.0.1", port=8080, max_width=640, quality=70):
+        self.host = host
+        self.port = port
+        self.max_width = max_width  # Ancho máximo del JPEG (None = tamaño original)
+        self.quality = quality
+        self.running = False
+
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._encode_lock = threading.Lock()
+        self._jpeg = None
+        self._jpeg_seq = 0
+        self._viewers = 0
+        self._httpd = None
+        self._thread = None
+
+    def start(self):
+        self._httpd = ThreadingHTTPServer((self.host, self.port), PreviewRequestHandler)
+        self.port = self._httpd.server_address[1]  # Puerto real si se pidió el 0
+        self._httpd.daemon_threads = True
+        self._httpd.preview = self
+        self.running = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def viewers(self):
+        return self._viewers
+
+    def add_viewer(self):
+        with self._cond:
+            self._viewers += 1
+
+    def remove_viewer(self):
+        with self._cond:
+            self._viewers -= 1
+
+    def publish(self, frame):
+        # Llamado desde el hilo de detección: solo guarda la referencia y avisa
+        with self._cond:
+            self._frame = frame
+            self._seq += 1
+            self._cond.notify_all()
+
+    def next_jpeg(self, last_seq, timeout=1):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > last_seq or not self.running, timeout):
+                return last_seq, None
+            frame, seq = self._frame, self._seq
+        if frame is None:
+            return last_seq, None
+
+        with self._encode_lock:
+            # Otro espectador pudo haber codificado ya este frame (o uno más nuevo)
+            if self._jpeg_seq < seq:
+                self._jpeg = self._encode(frame)
+                self._jpeg_seq = seq
+            return self._jpeg_seq, self._jpeg
+
+    def _encode(self, frame):
+        if self.max_width and frame.shape[1] > self.max_width:
+            height = int(frame.shape[0] * self.max_width / frame.shape[1])
+            frame = cv2.resize(frame, (self.max_width, height), interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), int(self.quality)])
+        return buf.tobytes() if ok else None
@@ -0,0 +1,122 @@
+"""Procesamiento de un frame: perfiles, detección, filtrado, analítica y alarma.
+
+Es el mismo código para la aplicación (``main.py``) y para la prueba de resistencia
+(``soak_test.py``); lo que depende de la interfaz (mostrar el frame, el registro de
+eventos, el sonido) queda en quien llama, que recibe un ``FrameResult``.
+"""
+import time
+
+import cv2
+import imutils
+import numpy as np
+
+from detection_cache import frame_hash
+from detector import CLASSES, CascadeDetector
+
+
+class FrameResult:
+    def __init__(self, frame, detections):
+        self.frame = frame  # Frame redimensionado y anotado
+        self.detections = detections  # Salida cruda de la red (1, 1, N, 7)
+        self.animals = []  # Clases aceptadas por el perfil vigente
+        self.tracked = []  # (animal, confianza, caja normalizada) para la analítica
+        self.frame_dets = []  # (clase, confianza, x1, y1, x2, y2) para el bus de frames
+        self.opened = []  # Clases de las visitas que empezaron en este frame
+        self.alarm = False
+        self.profile = None  # Descripción del perfil si cambió en este frame
+
+
+class FramePipeline:
+    def __init__(self, detector, profiles, analytics, alarm_policy, cache=None, gate_thresh=0.15,
+                 width=800, recorder=None):
+        self.detector = detector
+        self.profiles = profiles
+        self.analytics = analytics
+        self.alarm_policy = alarm_policy
+        self.cache = cache  # None = no reutilizar detecciones entre frames parecidos
+        self.gate_thresh = gate_thresh  # Umbral máximo de la etapa rápida en modo cascada
+        self.width = width
+        self.recorder = recorder
+        self.reset()
+
+    def reset(self):
+        self.frame_index = 0
+        self.settings = None
+        self._settings_key = None
+        self._input_size = None
+        self._detections = None
+        self.alarm_policy.reset()
+
+    def update_settings(self, conf_thresh, when=None, reloaded=False):
+        """Recalcula el perfil al cambiar el minuto, el umbral o el archivo.
+
+        Devuelve la descripción del perfil si cambió, o None."""
+        when = time.localtime() if when is None else when
+        key = (when.tm_hour, when.tm_min, float(conf_thresh))
+        if not reloaded and key == self._settings_key:
+            return None
+
+        previous = self.settings.describe() if self.settings else None
+        settings = self.settings = self.profiles.settings(key[2], when=when)
+        self._settings_key = key
+        if settings.input_size != self._input_size:
+            # Las detecciones guardadas corresponden a otra resolución de entrada
+            self.detector.set_input_size(settings.input_size)
+            if self.cache is not None:
+                self.cache.invalidate()
+            self._input_size = settings.input_size
+        self.alarm_policy.cooldown = settings.cooldown
+        if isinstance(self.detector, CascadeDetector):
+            # La etapa rápida no debe descartar frames que algún perfil aceptaría
+            self.detector.gate_thresh = min(self.gate_thresh, settings.min_conf_thresh)
+        description = settings.describe()
+        return description if description != previous else None
+
+    def detect(self, frame, timestamp):
+        # Con stride > 1 los frames intermedios reutilizan las últimas detecciones
+        if self._detections is not None and self.frame_index % self.settings.stride != 0:
+            return self._detections
+        if self.cache is None:
+            return self.detector.detect(frame)
+        # Reutilizar detecciones si el frame es casi idéntico a uno reciente
+        key = frame_hash(frame)
+        detections = self.cache.lookup(key, now=timestamp)
+        if detections is None:
+            detections = self.detector.detect(frame)
+            self.cache.store(key, detections, now=timestamp)
+        return detections
+
+    def process(self, frame, conf_thresh, timestamp=None, when=None, reloaded=False, can_alert=True):
+        timestamp = time.time() if timestamp is None else timestamp
+        frame = imutils.resize(frame, width=self.width)
+        (h, w) = frame.shape[:2]
+
+        profile = self.update_settings(conf_thresh, when, reloaded)
+        detections = self._detections = self.detect(frame, timestamp)
+        if self.recorder is not None:
+            self.recorder.write(self.frame_index, timestamp, detections)
+
+        result = FrameResult(frame, detections)
+        result.profile = profile
+        for i in np.arange(0, detections.shape[2]):
+            confidence = detections[0, 0, i, 2]
+            idx = int(detections[0, 0, i, 1])
+            if self.settings.accepts(CLASSES[idx], confidence, detections[0, 0, i, 3:7]):
+                box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
+                (startX, startY, endX, endY) = box.astype("int")
+
+                cv2.rectangle(frame, (startX, startY), (endX, endY), (36, 255, 12), 2)
+                label = f"{CLASSES[idx]}: {confidence * 100:.1f}%"
+                y = startY - 15 if startY - 15 > 15 else startY + 15
+                cv2.putText(frame, label, (startX, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (36, 255, 12), 2)
+
+                animal = CLASSES[idx]
+                result.animals.append(animal)
+                result.frame_dets.append((idx, confidence, *detections[0, 0, i, 3:7]))
+                result.tracked.append((animal, confidence, detections[0, 0, i, 3:7]))
+
+        # Registro de tiempos: abre, continúa o cierra visitas por pista
+        result.opened = self.analytics.update(result.tracked, timestamp)
+        result.alarm = self.alarm_policy.update(bool(result.animals), timestamp, can_alert=can_alert)
+        self.frame_index += 1
+        return result
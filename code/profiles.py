@@ -0,0 +1,151 @@
+"""Perfiles de sensibilidad por horario y por zona.
+
+Los perfiles se leen de un JSON (ver ``profiles.example.json``) y cambian en caliente:
+el archivo se vuelve a leer cuando cambia en disco y el perfil activo se recalcula
+cada minuto, sin reiniciar la detección.
+
+Cada perfil puede fijar ``conf_thresh``, ``classes``, ``stride`` (ejecutar la red
+cada N frames), ``input_size`` (resolución de entrada del SSD) y ``cooldown`` de la
+alarma. Lo que no se indique se toma del valor por defecto de la aplicación. Las
+zonas son rectángulos normalizados con su propio horario; una detección se juzga
+con el perfil de la zona que contiene el centro de su caja y, si no cae en ninguna,
+con el horario general. Una zona cuyo horario no cubre el minuto actual queda
+inactiva (sus detecciones se juzgan con el perfil general), y lo que no fije el
+perfil de una zona se hereda del perfil general.
+
+``stride``, ``input_size`` y ``cooldown`` afectan a todo el frame (hay una sola red y
+una sola alarma), así que se usa el valor más exigente entre el perfil general y los
+de las zonas activas: el stride y el cooldown más cortos y la resolución más alta.
+"""
+import json
+import os
+import time
+
+from detector import REQ_CLASSES
+
+
+class Profile:
+    def __init__(self, name, conf_thresh=None, classes=None, stride=None, input_size=None, cooldown=None):
+        self.name = name
+        self.conf_thresh = conf_thresh
+        self.classes = classes
+        self.stride = stride
+        self.input_size = input_size
+        self.cooldown = cooldown
+
+    @classmethod
+    def from_dict(cls, name, data):
+        return cls(name, data.get("conf_thresh"), data.get("classes"), data.get("stride"),
+                   data.get("input_size"), data.get("cooldown"))
+
+    def inherit(self, base):
+        # Copia con los campos sin definir tomados de ``base``
+        def pick(value, fallback):
+            return fallback if value is None else value
+        return Profile(self.name, pick(self.conf_thresh, base.conf_thresh), pick(self.classes, base.classes),
+                       pick(self.stride, base.stride), pick(self.input_size, base.input_size),
+                       pick(self.cooldown, base.cooldown))
+
+
+DEFAULT_PROFILE = Profile("predeterminado")
+
+
+def _minutes(hhmm):
+    hours, minutes = hhmm.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def _pick(schedule, minute_of_day, default=DEFAULT_PROFILE):
+    for start, end, profile in schedule:
+        # Los tramos pueden cruzar la medianoche (por ejemplo 19:00-07:00)
+        if start <= end:
+            if start <= minute_of_day < end:
+                return profile
+        elif minute_of_day >= start or minute_of_day < end:
+            return profile
+    return default
+
+
+class ActiveSettings:
+    """Perfiles vigentes en un momento dado, ya combinados con los valores por defecto."""
+
+    def __init__(self, general, zones, conf_thresh, stride, input_size, cooldown):
+        self.general = general
+        # [(nombre, (x1, y1, x2, y2), Profile)] solo de las zonas activas, ya completadas
+        # con el perfil general para que un campo sin definir no cuente en el mínimo/máximo
+        self.zones = [(name, rect, profile.inherit(general)) for name, rect, profile in zones]
+        self._default_conf = conf_thresh
+
+        profiles = [general] + [profile for _, _, profile in self.zones]
+        # La resolución, el stride y el cooldown son por frame: se usa el perfil más exigente
+        self.stride = min(p.stride or stride for p in profiles)
+        self.input_size = max(p.input_size or input_size for p in profiles)
+        self.cooldown = min(cooldown if p.cooldown is None else p.cooldown for p in profiles)
+        # Umbral más bajo vigente en cualquier zona (para no filtrar antes de tiempo)
+        self.min_conf_thresh = min(conf_thresh if p.conf_thresh is None else p.conf_thresh for p in profiles)
+
+    def profile_for(self, box):
+        cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+        for _, (x1, y1, x2, y2), profile in self.zones:
+            if x1 <= cx <= x2 and y1 <= cy <= y2:
+                return profile
+        return self.general
+
+    def accepts(self, animal, confidence, box):
+        profile = self.profile_for(box)
+        classes = profile.classes if profile.classes is not None else REQ_CLASSES
+        conf_thresh = profile.conf_thresh if profile.conf_thresh is not None else self._default_conf
+        return animal in classes and confidence > conf_thresh
+
+    def describe(self):
+        parts = [self.general.name] + [f"{name}: {profile.name}" for name, _, profile in self.zones]
+        return ", ".join(parts)
+
+
+class ProfileScheduler:
+    def __init__(self, path, reload_interval=5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._mtime = None
+        self._last_check = 0
+        self._schedule = []
+        self._zones = []
+
+    def load(self):
+        if not os.path.exists(self.path):
+            self._mtime = None
+            self._schedule, self._zones = [], []
+            return False
+
+        self._mtime = os.path.getmtime(self.path)
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        profiles = {name: Profile.from_dict(name, values) for name, values in data.get("profiles", {}).items()}
+
+        def parse_schedule(entries):
+            return [(_minutes(e["start"]), _minutes(e["end"]), profiles[e["profile"]]) for e in entries]
+
+        self._schedule = parse_schedule(data.get("schedule", []))
+        self._zones = [(zone["name"], tuple(zone["rect"]), parse_schedule(zone.get("schedule", [])))
+                       for zone in data.get("zones", [])]
+        return True
+
+    def reload_if_changed(self, now=None):
+        # Devuelve True si el archivo cambió y se volvió a cargar
+        now = time.time() if now is None else now
+        if now - self._last_check < self.reload_interval:
+            return False
+        self._last_check = now
+        mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+        if mtime == self._mtime:
+            return False
+        return self.load() or mtime is None
+
+    def settings(self, conf_thresh, stride=1, input_size=300, cooldown=5, when=None):
+        when = time.localtime() if when is None else when
+        minute_of_day = when.tm_hour * 60 + when.tm_min
+        general = _pick(self._schedule, minute_of_day)
+        zones = [(name, rect, _pick(schedule, minute_of_day, None)) for name, rect, schedule in self._zones]
+        zones = [(name, rect, profile) for name, rect, profile in zones if profile is not None]
+        return ActiveSettings(general, zones, conf_thresh, stride, input_size, cooldown)
@@ -0,0 +1,127 @@
+"""Repite el seguimiento, la política de alarma y el informe desde un archivo ``.dets``.
+
+No ejecuta la red: lee las detecciones guardadas por la aplicación junto al video
+(ver ``sidecar.py``) y usa las marcas de tiempo grabadas, así que el resultado es
+determinista y se procesan miles de frames por segundo. Sirve para investigar una
+falsa alarma o ajustar umbrales, ventana y cooldown sobre semanas de archivo.
+
+Uso:
+    python code/replay.py "videos/animal detection.mp4" --conf 0.35 --min-hits 20
+    python code/replay.py grabacion.mp4.dets --profiles code/profiles.json --report informe.txt
+    python code/replay.py grabacion.mp4.dets --heatmap mapa_calor.csv
+
+La única diferencia con la ejecución en vivo es que aquí una alarma no espera a que
+termine de sonar la anterior; solo cuenta el cooldown.
+"""
+import argparse
+import os
+import sys
+import time
+
+from alarm_policy import AlarmPolicy
+from analytics import DwellAnalytics, write_heatmap_csv, write_summary
+from detector import REQ_CLASSES
+from profiles import ProfileScheduler
+from sidecar import DetectionSidecar, latest_sidecar_path
+
+
+class ThresholdFilter:
+    # Equivalente a ActiveSettings.accepts sin perfiles: umbral único y clases fijas
+    def __init__(self, conf_thresh, classes=REQ_CLASSES):
+        self.conf_thresh = conf_thresh
+        self.classes = classes
+
+    def accepts(self, animal, confidence, box):
+        return animal in self.classes and confidence > self.conf_thresh
+
+
+def replay(sidecar, conf_thresh, policy, analytics, profiles=None):
+    alarms = []
+    frames = 0
+    settings = ThresholdFilter(conf_thresh)
+    settings_key = None
+    for frame_idx, timestamp, detections in sidecar.frames():
+        if profiles is not None:
+            when = time.localtime(timestamp)
+            key = (when.tm_yday, when.tm_hour, when.tm_min)
+            if key != settings_key:
+                settings = profiles.settings(conf_thresh, when=when)
+                settings_key = key
+                policy.cooldown = settings.cooldown
+
+        kept = [d for d in detections if settings.accepts(*d)]
+        analytics.update(kept, timestamp)
+        if policy.update(bool(kept), timestamp):
+            alarms.append((frame_idx, timestamp))
+        frames += 1
+
+    analytics.close_all()
+    return frames, alarms
+
+
+def write_report(path, analytics, alarms):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("=== INFORME DE DETECCIONES (REPETICIÓN) ===\n\n")
+        write_summary(f, analytics)
+        f.write("\n")
+        for frame_idx, timestamp in alarms:
+            f.write(f"Alarma: frame {frame_idx}, {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))}\n")
+        f.write("\n")
+        for animal, start, duration in analytics.visits():
+            f.write(f"Animal: {animal}\n")
+            f.write(f"Hora: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start + duration))}\n")
+            f.write(f"Duración: {duration:.2f} segundos\n")
+            f.write("-" * 30 + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Repetición determinista desde detecciones grabadas")
+    parser.add_argument("path", help="Video (se usa su grabación .dets más reciente) o archivo .dets")
+    parser.add_argument("--conf", type=float, default=0.2)
+    parser.add_argument("--window", type=int, default=36)
+    parser.add_argument("--min-hits", type=int, default=15)
+    parser.add_argument("--cooldown", type=float, default=5)
+    parser.add_argument("--max-missed", type=int, default=3, help="Frames sin ver una pista antes de cerrar la visita")
+    parser.add_argument("--iou", type=float, default=0.3, help="IoU mínimo para continuar una pista")
+    parser.add_argument("--profiles", help="Archivo de perfiles por horario y zona")
+    parser.add_argument("--report", help="Guardar el informe en este archivo")
+    parser.add_argument("--heatmap", help="Guardar el mapa de calor por clase en este CSV")
+    args = parser.parse_args()
+
+    path = args.path if args.path.endswith(".dets") else latest_sidecar_path(args.path)
+    if path is None or not os.path.exists(path):
+        parser.error(f"No se encontró el archivo de detecciones de: {args.path}")
+    print(f"[INFO] Detecciones: {path}")
+
+    sidecar = DetectionSidecar(path)
+    if args.conf <= sidecar.floor:
+        print(f"[WARNING] El archivo solo guarda cajas con confianza > {sidecar.floor:.2f}")
+
+    profiles = None
+    if args.profiles:
+        profiles = ProfileScheduler(args.profiles)
+        profiles.load()
+
+    policy = AlarmPolicy(window=args.window, min_hits=args.min_hits, cooldown=args.cooldown)
+    analytics = DwellAnalytics(REQ_CLASSES, iou_thresh=args.iou, max_missed=args.max_missed)
+
+    start = time.perf_counter()
+    frames, alarms = replay(sidecar, args.conf, policy, analytics, profiles)
+    elapsed = time.perf_counter() - start
+
+    print(f"[INFO] Frames: {frames}  ({frames / elapsed if elapsed else 0:.0f} frames/s)")
+    print(f"[INFO] Alarmas: {len(alarms)}")
+    for frame_idx, timestamp in alarms:
+        print(f"  frame {frame_idx:>7}  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))}")
+    write_summary(sys.stdout, analytics)
+
+    if args.report:
+        write_report(args.report, analytics, alarms)
+        print(f"[INFO] Informe guardado en {args.report}")
+    if args.heatmap:
+        write_heatmap_csv(args.heatmap, analytics)
+        print(f"[INFO] Mapa de calor guardado en {args.heatmap}")
+
+
+if __name__ == "__main__":
+    main()
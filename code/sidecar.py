@@ -0,0 +1,124 @@
+"""Archivo binario compacto con las detecciones de cada frame (``<video>.dets``).
+
+Guarda la salida de ``net.forward()`` reducida a las cajas de las clases de interés
+con confianza mayor que ``floor``, para poder repetir el seguimiento, la alarma y los
+informes sin volver a ejecutar la red.
+
+Formato (little-endian):
+    cabecera:  magic "BLMD", versión u16, reservado u16, fps del video f64, floor f32
+    por frame: índice u32, marca de tiempo f64, número de cajas u16
+    por caja:  clase u8, confianza f32, x1 y1 x2 y2 f32 (normalizados)
+
+Una grabación nunca sobrescribe a otra: si ``<video>.dets`` ya existe se usa
+``<video>.1.dets``, ``<video>.2.dets``, etc., siempre una versión por encima de la
+más alta que exista. Si la aplicación se cerró a mitad de un frame, la lectura se
+detiene en el último frame completo.
+"""
+import os
+import re
+import struct
+
+import numpy as np
+
+from detector import CLASSES, REQ_CLASSES
+
+MAGIC = b"BLMD"
+VERSION = 1
+HEADER = struct.Struct("<4sHHdf")
+FRAME = struct.Struct("<IdH")
+BOX_DTYPE = np.dtype([("cls", "u1"), ("conf", "<f4"), ("box", "<f4", (4,))])
+
+_REQ_IDX = np.array([CLASSES.index(c) for c in REQ_CLASSES])
+
+
+def sidecar_path(video_path, version=0):
+    return f"{video_path}.dets" if version == 0 else f"{video_path}.{version}.dets"
+
+
+def _sidecar_versions(video_path):
+    # {versión: ruta} de todas las grabaciones del video, aunque falten números
+    folder, name = os.path.split(video_path)
+    pattern = re.compile(re.escape(name) + r"(?:\.(\d+))?\.dets$")
+    versions = {}
+    if not os.path.isdir(folder or "."):
+        return versions
+    for entry in os.listdir(folder or "."):
+        match = pattern.match(entry)
+        if match:
+            versions[int(match.group(1) or 0)] = os.path.join(folder, entry)
+    return versions
+
+
+def next_sidecar_path(video_path):
+    # Nombre para una grabación nueva: una versión por encima de la más alta existente
+    versions = _sidecar_versions(video_path)
+    return sidecar_path(video_path, max(versions) + 1 if versions else 0)
+
+
+def latest_sidecar_path(video_path):
+    # Grabación de versión más alta del video, o None si no hay ninguna
+    versions = _sidecar_versions(video_path)
+    return versions[max(versions)] if versions else None
+
+
+class DetectionRecorder:
+    def __init__(self, path, video_fps, floor=0.05):
+        self.path = path
+        self.floor = floor
+        self._file = open(path, "xb")  # FileExistsError antes que pisar otra grabación
+        self._file.write(HEADER.pack(MAGIC, VERSION, 0, float(video_fps), floor))
+
+    def write(self, frame_idx, timestamp, detections):
+        rows = detections[0, 0]
+        keep = (rows[:, 2] > self.floor) & np.isin(rows[:, 1].astype(int), _REQ_IDX)
+        rows = rows[keep]
+
+        boxes = np.empty(len(rows), dtype=BOX_DTYPE)
+        boxes["cls"] = rows[:, 1]
+        boxes["conf"] = rows[:, 2]
+        boxes["box"] = rows[:, 3:7]
+        self._file.write(FRAME.pack(frame_idx, timestamp, len(boxes)))
+        self._file.write(boxes.tobytes())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class DetectionSidecar:
+    def __init__(self, path):
+        self.path = path
+        self.truncated = False
+        with open(path, "rb") as f:
+            self._data = f.read()
+        if len(self._data) < HEADER.size:
+            raise ValueError(f"{path} no es un archivo de detecciones")
+        magic, version, _, self.video_fps, self.floor = HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} no es un archivo de detecciones")
+        if version != VERSION:
+            raise ValueError(f"Versión de archivo no soportada: {version}")
+
+    def frames(self):
+        """Itera ``(índice, marca de tiempo, [(animal, confianza, (x1, y1, x2, y2))])``.
+
+        Si el último registro está incompleto se detiene en el frame anterior y avisa."""
+        data = self._data
+        offset = HEADER.size
+        frames = 0
+        while offset + FRAME.size <= len(data):
+            frame_idx, timestamp, count = FRAME.unpack_from(data, offset)
+            end = offset + FRAME.size + count * BOX_DTYPE.itemsize
+            if end > len(data):
+                break
+            boxes = np.frombuffer(data, dtype=BOX_DTYPE, count=count, offset=offset + FRAME.size)
+            offset = end
+            frames += 1
+            yield frame_idx, timestamp, [(CLASSES[b["cls"]], float(b["conf"]), tuple(b["box"].tolist()))
+                                         for b in boxes]
+
+        if offset < len(data):
+            self.truncated = True
+            print(f"[WARNING] {self.path} está truncado: se leyeron {frames} frames completos "
+                  f"y se ignoran {len(data) - offset} bytes finales")
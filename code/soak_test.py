@@ -0,0 +1,403 @@
+"""Prueba de resistencia (soak test) para operación 24/7.
+
+Reproduce el video incluido en bucle y sin pausas con el mismo ``FramePipeline``
+que usa la aplicación (perfiles, caché, detector, analítica y alarma), más las
+salidas de la ejecución real: bus de frames, servidor MJPEG con un visor conectado
+que se reconecta cada tanto, grabación de detecciones (un ``.dets`` por vuelta del
+video) y el motor de sonido. Con ``--gui`` abre además la aplicación completa
+(``main.py``) y la maneja sola, así que también se miden el refresco de la imagen y
+el registro de eventos.
+
+Cada ``--sample`` segundos registra memoria residente (RSS), hilos, descriptores de
+archivo abiertos y FPS. Al terminar ajusta una recta a cada serie (descartando el
+calentamiento) y falla si alguna crece más de lo tolerado.
+
+Uso:
+    python code/soak_test.py --hours 4 --csv soak.csv
+    python code/soak_test.py --hours 4 --gui
+
+Sin ``--gui`` el reloj que ven la analítica y la alarma avanza al ritmo del video, no
+del reloj real, así que unas horas de prueba equivalen a días de video.
+"""
+import argparse
+import csv
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from alarm_policy import AlarmPolicy
+from analytics import DwellAnalytics
+from audio import AlarmSoundEngine, ALERT_PATH
+from detection_cache import DetectionCache
+from detector import PROTO_PATH, MODEL_PATH, REQ_CLASSES, load_model, SingleStageDetector
+from frame_bus import FrameBusWriter
+from mjpeg_server import MJPEGServer
+from pipeline import FramePipeline
+from profiles import ProfileScheduler
+from sidecar import DetectionRecorder
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_VIDEO = os.path.join(REPO_ROOT, "videos", "animal detection.mp4")
+DEFAULT_PROFILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles.json")
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def rss_mb():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 2 ** 20
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def open_handles():
+    if psutil is not None:
+        proc = psutil.Process()
+        return proc.num_handles() if hasattr(proc, "num_handles") else proc.num_fds()
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+def watch_stream(port, stop, reconnect=60.0):
+    # Visor MJPEG que lee y descarta el stream; cierra y reabre la conexión cada
+    # ``reconnect`` segundos para que el servidor también libere visores
+    while not stop.is_set():
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=5) as conn:
+                conn.sendall(b"GET /stream HTTP/1.1\r\nHost: localhost\r\n\r\n")
+                until = time.monotonic() + reconnect
+                while not stop.is_set() and time.monotonic() < until:
+                    if not conn.recv(65536):
+                        break
+        except OSError:
+            stop.wait(1.0)
+
+
+def slope_per_hour(times, values):
+    # Pendiente por mínimos cuadrados, en unidades por hora
+    if len(values) < 3:
+        return 0.0
+    t = np.asarray(times) / 3600.0
+    return float(np.polyfit(t, np.asarray(values, dtype=np.float64), 1)[0])
+
+
+class SoakRunner:
+    def __init__(self, args):
+        self.args = args
+        self.net = load_model(args.proto, args.model)
+        self.detector = SingleStageDetector(self.net)
+        self.analytics = DwellAnalytics(REQ_CLASSES)
+        self.alarm_policy = AlarmPolicy()
+        self.profiles = ProfileScheduler(args.profiles)
+        self.pipeline = FramePipeline(self.detector, self.profiles, self.analytics, self.alarm_policy,
+                                      cache=DetectionCache() if args.cache else None)
+        self.frame_bus = None
+        self.preview_server = None
+        self.audio = None
+        self.recorder = None
+        self.record_dir = None
+        self.alarms = 0
+        self.frames = 0
+        self.samples = []
+
+    def open_video(self):
+        cap = cv2.VideoCapture(self.args.video)
+        if not cap.isOpened():
+            raise IOError(f"No se pudo abrir el archivo de video: {self.args.video}")
+        return cap
+
+    def start_outputs(self):
+        args = self.args
+        if args.preview_port >= 0:
+            self.preview_server = MJPEGServer(port=args.preview_port).start()
+            self.viewer_stop = threading.Event()
+            threading.Thread(target=watch_stream, args=(self.preview_server.port, self.viewer_stop),
+                             daemon=True).start()
+        if args.audio:
+            try:
+                self.audio = AlarmSoundEngine({"alarma": ALERT_PATH})
+            except Exception as e:
+                print(f"[WARNING] Sin sonido: {e}")
+        if args.record:
+            self.record_dir = tempfile.mkdtemp(prefix="balamia_soak_")
+
+    def stop_outputs(self):
+        if self.preview_server is not None:
+            self.viewer_stop.set()
+            self.preview_server.stop()
+        if self.audio is not None:
+            self.audio.close()
+        self.rotate_recorder(None)
+        if self.record_dir is not None:
+            os.rmdir(self.record_dir)
+
+    def rotate_recorder(self, video_fps):
+        # Un archivo de detecciones por vuelta del video; el anterior se borra
+        if self.recorder is not None:
+            self.recorder.close()
+            os.remove(self.recorder.path)
+            self.recorder = None
+        if video_fps is not None and self.record_dir is not None:
+            self.recorder = DetectionRecorder(os.path.join(self.record_dir, "soak.dets"), video_fps)
+        self.pipeline.recorder = self.recorder
+
+    def process(self, frame, sim_time):
+        can_alert = self.audio is None or not self.audio.is_playing()
+        result = self.pipeline.process(frame, self.args.conf, timestamp=sim_time, when=time.localtime(sim_time),
+                                       reloaded=self.profiles.reload_if_changed(), can_alert=can_alert)
+        if result.alarm:
+            self.alarms += 1
+            if self.audio is not None:
+                self.audio.play("alarma", priority=10)
+
+        if self.args.frame_bus:
+            if self.frame_bus is None:
+                self.frame_bus = FrameBusWriter(self.args.frame_bus, result.frame.shape)
+            self.frame_bus.write(result.frame, result.frame_dets, timestamp=sim_time)
+        if self.preview_server is not None:
+            self.preview_server.publish(result.frame)
+
+    def sample(self, elapsed, fps):
+        row = {
+            "elapsed": elapsed,
+            "rss_mb": rss_mb(),
+            "threads": threading.active_count(),
+            "handles": open_handles(),
+            "fps": fps,
+            "frames": self.frames,
+            "visits": self.analytics.n_visits,
+            "alarms": self.alarms,
+            "viewers": self.preview_server.viewers() if self.preview_server is not None else 0,
+        }
+        self.samples.append(row)
+        print(f"[INFO] {elapsed / 60:7.1f} min  RSS: {row['rss_mb'] or 0:.1f} MB  hilos: {row['threads']}  "
+              f"descriptores: {row['handles']}  FPS: {fps:.2f}  visitas: {row['visits']}  alarmas: {self.alarms}")
+        return row
+
+    def run(self):
+        duration = self.args.hours * 3600
+        cap = self.open_video()
+        video_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        sim_time = time.time()
+        self.start_outputs()
+        self.rotate_recorder(video_fps)
+
+        start = time.perf_counter()
+        next_sample = start
+        window_frames = 0
+        window_start = start
+        try:
+            while time.perf_counter() - start < duration:
+                ret, frame = cap.read()
+                if not ret:
+                    # Fin del video: volver al inicio como un video en bucle
+                    cap.release()
+                    cap = self.open_video()
+                    self.rotate_recorder(video_fps)
+                    continue
+
+                self.process(frame, sim_time)
+                sim_time += 1.0 / video_fps
+                self.frames += 1
+                window_frames += 1
+
+                now = time.perf_counter()
+                if now >= next_sample:
+                    fps = window_frames / (now - window_start) if now > window_start else 0.0
+                    self.sample(now - start, fps)
+                    window_frames = 0
+                    window_start = now
+                    next_sample = now + self.args.sample
+        finally:
+            cap.release()
+            if self.frame_bus is not None:
+                self.frame_bus.close()
+            self.stop_outputs()
+
+    def check(self):
+        args = self.args
+        samples = [s for s in self.samples if s["elapsed"] >= args.warmup * 60]
+        if len(samples) < 3:
+            print("[ERROR] Muy pocas muestras después del calentamiento para evaluar tendencias")
+            return False
+
+        times = [s["elapsed"] for s in samples]
+        hours = max((times[-1] - times[0]) / 3600.0, 1e-9)
+        ok = True
+
+        limits = [
+            ("rss_mb", args.rss_tolerance, "MB"),
+            ("threads", args.threads_tolerance, "hilos"),
+            ("handles", args.handles_tolerance, "descriptores"),
+        ]
+        for field, tolerance, unit in limits:
+            values = [s[field] for s in samples]
+            if any(v is None for v in values):
+                print(f"[WARNING] {field}: no disponible en esta plataforma")
+                continue
+            growth = slope_per_hour(times, values) * hours
+            status = "OK" if growth <= tolerance else "FALLA"
+            ok = ok and growth <= tolerance
+            print(f"[{status}] {field}: crecimiento estimado {growth:+.2f} {unit} (tolerancia {tolerance} {unit})")
+
+        # Deriva de FPS: primer cuarto contra último cuarto de la prueba
+        quarter = max(len(samples) // 4, 1)
+        fps_start = np.mean([s["fps"] for s in samples[:quarter]])
+        fps_end = np.mean([s["fps"] for s in samples[-quarter:]])
+        drift = (fps_start - fps_end) / fps_start * 100 if fps_start else 0.0
+        status = "OK" if drift <= args.fps_tolerance else "FALLA"
+        ok = ok and drift <= args.fps_tolerance
+        print(f"[{status}] fps: {fps_start:.2f} -> {fps_end:.2f} ({drift:+.1f}% de caída, tolerancia {args.fps_tolerance}%)")
+        return ok
+
+    def write_csv(self, path):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(self.samples[0].keys()))
+            writer.writeheader()
+            writer.writerows(self.samples)
+
+
+class GuiSoakRunner(SoakRunner):
+    """Maneja la aplicación real: reinicia la detección cada vez que termina el video."""
+
+    def __init__(self, args):
+        import tkinter as tk
+        import main as app
+
+        app.RECORD_DETECTIONS = args.record
+        app.PREVIEW_SERVER_PORT = args.preview_port if args.preview_port >= 0 else None
+        self.args = args
+        self.root = tk.Tk()
+        self.app = app.AnimalDetectionApp(self.root)
+        self.app.source_var.set("Archivo")
+        self.app.file_entry.insert(0, args.video)
+        self.app.threshold_var.set(f"{args.conf:.2f}")
+        self.app.use_cache_var.set(args.cache)
+        if not args.audio and self.app.audio is not None:
+            self.app.audio.close()
+            self.app.audio = None
+        self.analytics = self.app.analytics
+        self.preview_server = self.app.preview_server
+        self.alarms = 0
+        self.frames = 0
+        self.samples = []
+        self._done_frames = 0
+        self._recorded = None
+
+        trigger_alarm = self.app.trigger_alarm
+
+        def counted_alarm():
+            self.alarms += 1
+            trigger_alarm()
+        self.app.trigger_alarm = counted_alarm
+
+    def remove_recording(self):
+        # El .dets de cada vuelta se borra para no llenar el disco junto al video
+        if self._recorded is not None and os.path.exists(self._recorded):
+            os.remove(self._recorded)
+        self._recorded = None
+
+    def restart(self):
+        if self.app.pipeline is not None:
+            self._done_frames += self.app.pipeline.frame_index
+        self.remove_recording()
+        self.app.start_detection()
+        if self.app.recorder is not None:
+            self._recorded = self.app.recorder.path
+
+    def sample(self, elapsed, fps):
+        pipeline = self.app.pipeline
+        self.frames = self._done_frames + (pipeline.frame_index if pipeline is not None else 0)
+        row = super().sample(elapsed, fps)
+        row["log_lines"] = int(self.app.event_log.index("end-1c").split(".")[0])
+        return row
+
+    def run(self):
+        duration = self.args.hours * 3600
+        start = time.perf_counter()
+        next_sample = [start]
+
+        def tick():
+            now = time.perf_counter()
+            thread = getattr(self.app, "detection_thread", None)
+            running = thread is not None and thread.is_alive()
+            if now - start >= duration:
+                # Esperar a que el hilo de detección termine antes de cerrar la ventana
+                self.app.stop_detection()
+                if running:
+                    self.root.after(100, tick)
+                else:
+                    self.remove_recording()
+                    self.app.on_closing()
+                return
+            if not self.app.detecting and not running:
+                self.restart()
+            if now >= next_sample[0]:
+                self.sample(now - start, self.app.fps.fps() if self.app.fps is not None else 0.0)
+                next_sample[0] = now + self.args.sample
+            self.root.after(200, tick)
+
+        viewer_stop = threading.Event()
+        if self.preview_server is not None:
+            threading.Thread(target=watch_stream, args=(self.preview_server.port, viewer_stop), daemon=True).start()
+        self.root.after(0, tick)
+        try:
+            self.root.mainloop()
+        finally:
+            viewer_stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de resistencia sin interfaz")
+    parser.add_argument("--video", default=DEFAULT_VIDEO)
+    parser.add_argument("--proto", default=PROTO_PATH)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--profiles", default=DEFAULT_PROFILES)
+    parser.add_argument("--conf", type=float, default=0.2)
+    parser.add_argument("--hours", type=float, default=1.0, help="Duración de la prueba (tiempo real)")
+    parser.add_argument("--sample", type=float, default=30.0, help="Segundos entre muestras")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Minutos iniciales que no se evalúan")
+    parser.add_argument("--frame-bus", default="balamia_soak", help="Nombre del bus de frames ('' lo desactiva)")
+    parser.add_argument("--preview-port", type=int, default=0,
+                        help="Puerto del servidor MJPEG (0 = uno libre, -1 lo desactiva)")
+    parser.add_argument("--no-audio", dest="audio", action="store_false", help="No cargar ni reproducir la alarma")
+    parser.add_argument("--no-record", dest="record", action="store_false", help="No grabar las detecciones")
+    parser.add_argument("--cache", action="store_true", help="Reutilizar detecciones de frames repetidos")
+    parser.add_argument("--gui", action="store_true", help="Ejecutar la aplicación completa con interfaz")
+    parser.add_argument("--rss-tolerance", type=float, default=50.0, help="MB de crecimiento permitidos")
+    parser.add_argument("--threads-tolerance", type=float, default=1.0)
+    parser.add_argument("--handles-tolerance", type=float, default=5.0)
+    parser.add_argument("--fps-tolerance", type=float, default=10.0, help="Caída de FPS permitida, en %%")
+    parser.add_argument("--csv", help="Guardar las muestras en este archivo")
+    args = parser.parse_args()
+
+    runner = GuiSoakRunner(args) if args.gui else SoakRunner(args)
+    try:
+        runner.run()
+    except KeyboardInterrupt:
+        print("[WARNING] Prueba interrumpida; se evalúan las muestras tomadas")
+
+    if args.csv and runner.samples:
+        runner.write_csv(args.csv)
+    sys.exit(0 if runner.check() else 1)
+
+
+if __name__ == "__main__":
+    main()